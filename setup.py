@@ -11,7 +11,6 @@ setup(
     install_requires=[
         'numpy',
         'scipy',
-        'pandas',
         'matplotlib',
         
         'platformdirs',
@@ -21,8 +20,15 @@ setup(
         
         'moderngl',
         'PyOpenGL; platform_system=="Linux"',
-        'scikit-image',
     ],
+    extras_require={
+        # faster encoding / decoding of RPC requests
+        'orjson': ['orjson'],
+        # buffered reads of h5 files on network filesystems (h5io.open_file_for_reading(..., remote=True))
+        'remote': ['fsspec'],
+        # compiled subject pose and point conversion kernels
+        'numba': ['numba'],
+    },
     entry_points={
         'console_scripts': [
             'stimpack=stimpack.experiment.gui:main'
@@ -1,5 +1,6 @@
-import signal, sys, os
+import signal, sys, os, traceback
 from math import radians
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
 
@@ -9,13 +10,16 @@ from stimpack.visual_stim.stim_server import VisualStimServer
 from stimpack.device.locomotion.loco_managers import LocoManager
 from stimpack.device.daq import DAQ
 
-from stimpack.rpc.util import start_daemon_thread, find_free_port
+from stimpack.rpc.util import start_daemon_thread, find_free_port, TargetProxy
 from stimpack.rpc.transceiver import MySocketServer
 
 from stimpack.experiment.util import config_tools
 
 from stimpack.util import ROOT_DIR
 
+# Name (prefix) of the server's worker thread for slow root functions
+WORKER_THREAD_NAME = 'server_worker'
+
 class BaseServer(MySocketServer):
     def __init__(self, host='', port=60629, 
                     visual_stim_kwargs={},
@@ -54,12 +58,21 @@ class BaseServer(MySocketServer):
             self.modules['daq'] = daq_class(**daq_kwargs)
         ### DAQ manager ###
 
+        # Bound request handlers of each module, used when dispatching requests
+        self.module_dispatchers = [(module_name, module.handle_request_list) for module_name, module in self.modules.items()]
+
+        # Worker thread for slow root functions (e.g. module loading), so they don't block the request loop.
+        # A single worker keeps slow functions in the order they were requested.
+        self.worker_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix=WORKER_THREAD_NAME)
+
         # Register functions to be executed on the server's root node, and not in modules.
         self.functions_on_root = {}
         self.register_function_on_root(lambda x: print(x), "print_on_server")
         self.register_function_on_root(self.set_subject_state, "set_subject_state")
-        self.register_function_on_root(self.load_server_side_state_dependent_control, "load_server_side_state_dependent_control")
-        self.register_function_on_root(self.unload_server_side_state_dependent_control, "unload_server_side_state_dependent_control")
+        self.register_function_on_root(self.load_server_side_state_dependent_control, "load_server_side_state_dependent_control", run_on_worker=True)
+        # unload runs on the worker as well, so that it cannot overtake a load that is still running.
+        # Until a load has finished, set_subject_state keeps applying the control loaded before it (if any).
+        self.register_function_on_root(self.unload_server_side_state_dependent_control, "unload_server_side_state_dependent_control", run_on_worker=True)
 
         def signal_handler(sig, frame):
             print('Closing server after Ctrl+C...')
@@ -77,6 +90,11 @@ class BaseServer(MySocketServer):
         if start_loop:
             start_daemon_thread(self.loop)
 
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # names of class attributes / methods, so that __getattr__ need not call dir() on every miss
+        cls._attr_names = frozenset(dir(cls))
+
     def __getattr__(self, name):
         '''
         Allow the server to execute function calls as client, assuming server isn't busy looping. 
@@ -84,62 +102,75 @@ class BaseServer(MySocketServer):
         '''
         
         # If call is for an attribute / method of the server class, return it.
-        if name in dir(self):
-            return self.name
-
-        # If call is target('module_name'), return a dummy module object that will handle the request.
-        elif name == 'target':
-            def f(module_name):
-                class dummy_module:
-                    def __getattr__(module_self, module_attr_name):
-                        def g(*args, **kwargs):
-                            request = {'target': module_name, 
-                                       'name': module_attr_name, 
-                                       'args': args, 
-                                       'kwargs': kwargs}
-                            self.handle_request_list([request])
-                        return g
-                return dummy_module()
-            return f
+        if name in type(self)._attr_names:
+            return object.__getattribute__(self, name)
+
+        # Reuse the function made for this name on earlier calls.
+        thunk = self.request_thunks.get(name)
+        if thunk is not None:
+            return thunk
+
+        # If call is target('module_name'), return a proxy module object that will handle the request.
+        if name == 'target':
+            def thunk(module_name):
+                proxy = self.target_proxies.get(module_name)
+                if proxy is None:
+                    proxy = TargetProxy(module_name, lambda request: self.handle_request_list([request]))
+                    self.target_proxies[module_name] = proxy
+                return proxy
         
         # If not a method of the server class and target not specified, 
         #   handle it as a request to the root nodoe.
         else:
             # print(f"Server does not have attribute {name}; call must be for either module or an attribute or method of BaseServer.")            
-            def f(*args, **kwargs):
+            def thunk(*args, **kwargs):
                 request = {'target': 'root',
                            'name': name, 
                            'args': args, 
                            'kwargs': kwargs}
                 self.handle_request_list([request])
-            return f
+
+        self.request_thunks[name] = thunk
+        return thunk
     
     # def loop(self):
     #     self.run_function_in_all_modules('loop')
 
-    def register_function_on_root(self, function, name=None):
+    def register_function_on_root(self, function, name=None, run_on_worker=False):
         '''
         Register function to be executed on the server's root node only, and not on the clients (i.e. screens).
+
+        If run_on_worker is True, the function is executed on the server's worker thread instead of inline,
+        so that slow functions do not hold up other requests, which are handled without waiting for it.
+        Worker functions run one at a time, in the order they were requested, but concurrently with the request loop:
+        they should apply their result with a single attribute assignment at the end, so that requests handled
+        meanwhile see either the old state or the new one.
         '''
         if name is None:
             name = function.__name__
 
         assert name not in self.functions_on_root, 'Function "{}" already defined.'.format(name)
-        self.functions_on_root[name] = function
+        self.functions_on_root[name] = (function, run_on_worker)
 
     def handle_request_list_to_root(self, root_request_list):
+        functions_on_root = self.functions_on_root
         for request in root_request_list:
             # get function call parameters
-            if request['name'] not in self.functions_on_root:
+            entry = functions_on_root.get(request['name'])
+            if entry is None:
                 print(f"Warning: function '{request['name']}' not registered on root node.")
                 continue
-            function = self.functions_on_root[request['name']]
+            function, run_on_worker = entry
             args = request.get('args', [])
             kwargs = request.get('kwargs', {})
 
             # call function
             # print(f"Server root node executing: {str(request)}")
-            function(*args, **kwargs)
+            if run_on_worker:
+                future = self.worker_pool.submit(function, *args, **kwargs)
+                future.add_done_callback(print_worker_exception)
+            else:
+                function(*args, **kwargs)
 
     def handle_request_list(self, request_list):
         # pre-process the request list as necessary
@@ -155,13 +186,14 @@ class BaseServer(MySocketServer):
         self.handle_request_list_to_root(root_request_list)
 
         # Pull out and process requests for each module
-        for module_name, module in self.modules.items():
+        for module_name, module_handle_request_list in self.module_dispatchers:
             module_request_list = [request for request in request_list if request['target'] in [module_name, 'all']]
             if len(module_request_list) > 0:
-                module.handle_request_list(module_request_list)
+                module_handle_request_list(module_request_list)
 
     def close(self):
         self.target('all').close()
+        self.worker_pool.shutdown(wait=False)
 
     def on_connection_close(self):
         '''
@@ -169,13 +201,16 @@ class BaseServer(MySocketServer):
         Overrides the function in MySocketServer.
         It calls on_connection_close() for each module.
         '''
-        [module.on_connection_close() for module in self.modules.values()]
+        for module in self.modules.values():
+            module.on_connection_close()
         
     ### Functions for setting subject state ###
     def set_subject_state(self, state_update:dict={'x': 0, 'y': 0, 'z': 0, 'theta': 0, 'phi': 0, 'roll':0}) -> None:
-        # Perform custom closed-loop control and get an updated state update
-        if self.loaded_custom_state_dependent_control is not None:
-            state_update = self.loaded_custom_state_dependent_control(self, self.subject_state, state_update)
+        # Perform custom closed-loop control and get an updated state update.
+        # The control is read once, as the worker thread may swap it in or out at any time (see load / unload).
+        control = self.loaded_custom_state_dependent_control
+        if control is not None:
+            state_update = control(self, self.subject_state, state_update)
 
         # Update the subject state
         for k,v in state_update.items():
@@ -187,6 +222,7 @@ class BaseServer(MySocketServer):
     def load_server_side_state_dependent_control(self, protocol_module_path, protocol_name):
         '''
         Load a custom state-dependent control function.
+        Runs on the worker thread; the loaded function replaces the previous one only once loading has finished.
         '''
         if protocol_module_path is None: # No user-specified protocol module, use Stimpack protocol
             protocol_module_full_path = os.path.join(ROOT_DIR, 'experiment', 'example_protocol.py')
@@ -202,4 +238,16 @@ class BaseServer(MySocketServer):
         '''
         Unload custom state-dependent control function.
         '''
-        self.loaded_custom_state_dependent_control = None
\ No newline at end of file
+        self.loaded_custom_state_dependent_control = None
+
+# __init_subclass__ only runs for subclasses, so set the attribute names for BaseServer itself here.
+BaseServer._attr_names = frozenset(dir(BaseServer))
+
+def print_worker_exception(future):
+    '''
+    Print the traceback of an exception raised by a function run on the server's worker thread,
+    which would otherwise be silently stored on the future.
+    '''
+    exception = future.exception()
+    if exception is not None:
+        traceback.print_exception(type(exception), exception, exception.__traceback__)
@@ -1,10 +1,20 @@
 import os
 import glob
+import copy
 from platformdirs import user_config_dir
 import yaml
 import sys
 from importlib.util import spec_from_file_location, module_from_spec
 
+# Use the libyaml-backed loader if PyYAML was built with it
+try:
+    from yaml import CSafeLoader as YamlSafeLoader
+except ImportError:
+    from yaml import SafeLoader as YamlSafeLoader
+
+# Parsed configuration files, keyed by path: (mtime, cfg)
+_configuration_file_cache = {}
+
 def get_stimpack_config_directory(ensure_exists=True):
     return user_config_dir(appname="stimpack", ensure_exists=ensure_exists)
 
@@ -66,8 +76,16 @@ def get_configuration_file(cfg_name, labpack_dir=None):
     
     cfg_path = os.path.join(labpack_dir, 'configs', cfg_name)
     if os.path.exists(cfg_path):
-        with open(cfg_path, 'r') as ymlfile:
-            cfg = yaml.safe_load(ymlfile)
+        mtime = os.path.getmtime(cfg_path)
+        cached = _configuration_file_cache.get(cfg_path)
+        if cached is not None and cached[0] == mtime:
+            cfg = cached[1]
+        else:
+            with open(cfg_path, 'r') as ymlfile:
+                cfg = yaml.load(ymlfile, Loader=YamlSafeLoader)
+            _configuration_file_cache[cfg_path] = (mtime, cfg)
+        # callers modify the returned config, so hand out a copy of the cached one
+        cfg = copy.deepcopy(cfg)
     else:
         cfg = get_default_config()
 
@@ -111,12 +129,14 @@ def get_paths_to_module(cfg, module_name, single_item_in_list=False):
         module_paths = [module_paths]
     return module_paths
 
-def convert_labpack_relative_path_to_full_path(path):
+def convert_labpack_relative_path_to_full_path(path, labpack_dir=None):
     """Converts a path relative to the labpack directory to a full path"""
     if os.path.isabs(path):
         full_path = path
     else:
-        full_path = os.path.join(get_labpack_directory(), path)
+        if labpack_dir is None:
+            labpack_dir = get_labpack_directory()
+        full_path = os.path.join(labpack_dir, path)
 
     return full_path
 
@@ -132,7 +152,9 @@ def get_full_paths_to_module(cfg, module_name, single_item_in_list=False):
     if module_paths is None:
         return None
     else:
-        full_paths = [convert_labpack_relative_path_to_full_path(mp) for mp in module_paths]
+        # look up the labpack directory once rather than once per path
+        labpack_dir = get_labpack_directory()
+        full_paths = [convert_labpack_relative_path_to_full_path(mp, labpack_dir=labpack_dir) for mp in module_paths]
         if len(full_paths) == 1 and not single_item_in_list:
             return full_paths[0]
         return full_paths
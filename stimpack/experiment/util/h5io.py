@@ -1,9 +1,28 @@
+import re
+from contextlib import contextmanager
+
 import h5py
-import numpy as np
 
 # H5io fxns
-def get_hierarchy(file_path, additional_exclusions=None):
-    with h5py.File(file_path, 'r') as experiment_file:
+@contextmanager
+def open_file_for_reading(file_path, remote=False, block_size=8*1024*1024):
+    """
+    Open an h5 file read-only.
+    If remote is True (e.g. file on a network filesystem), the file is read through fsspec in blocks of
+    block_size bytes, so that walking the file's metadata does not turn into many small reads.
+    Requires fsspec (pip install stimpack[remote]).
+    """
+    if remote:
+        import fsspec
+        with fsspec.open(file_path, mode='rb', cache_type='mmap', block_size=block_size) as buffered_file:
+            with h5py.File(buffered_file, 'r') as experiment_file:
+                yield experiment_file
+    else:
+        with h5py.File(file_path, 'r') as experiment_file:
+            yield experiment_file
+
+def get_hierarchy(file_path, additional_exclusions=None, remote=False, block_size=8*1024*1024):
+    with open_file_for_reading(file_path, remote=remote, block_size=block_size) as experiment_file:
         hierarchy = recursively_load_dict_contents_from_group(experiment_file, '/', additional_exclusions=additional_exclusions)
     return hierarchy
 
@@ -17,13 +36,11 @@ def get_path_from_tree_item(tree_item):
     path = '/' + path
     return path
 
-def get_attributes_from_group(file_path, group_path):
+def get_attributes_from_group(file_path, group_path, remote=False, block_size=8*1024*1024):
     # see https://github.com/CCampJr/LazyHDF5
-    with h5py.File(file_path, 'r+') as experiment_file:
+    with open_file_for_reading(file_path, remote=remote, block_size=block_size) as experiment_file:
         group = experiment_file[group_path]
-        attr_dict = {}
-        for at in group.attrs:
-            attr_dict[at] = group.attrs[at]
+        attr_dict = dict(group.attrs.items())
         return attr_dict
 
 def change_attribute(file_path, group_path, attr_key, attr_val):
@@ -39,13 +56,17 @@ def recursively_load_dict_contents_from_group(h5file, path, additional_exclusion
     exclusions = ['acquisition', 'Client', 'epochs', 'stimulus_timing', 'roipath', 'subpath']
     if additional_exclusions is not None:
         exclusions.append(additional_exclusions)
+    # a key is excluded if it contains any of the exclusion strings
+    exclusion_pattern = re.compile('|'.join(map(re.escape, exclusions)))
     ans = {}
-    for key, item in h5file[path].items():
-        if isinstance(item, h5py._hl.dataset.Dataset):
-            pass
-        elif isinstance(item, h5py._hl.group.Group):
-            if np.any([x in key for x in exclusions]):
-                pass
-            else:
-                ans[key] = recursively_load_dict_contents_from_group(h5file, path + key + '/', additional_exclusions=additional_exclusions)
-    return ans
\ No newline at end of file
+
+    # Walk the groups with an explicit stack of (group, dict to fill), rather than recursing.
+    # Excluded groups are skipped before descending, so their (often large) subtrees are never visited.
+    stack = [(h5file[path], ans)]
+    while stack:
+        group, group_dict = stack.pop()
+        for key, item in group.items():
+            if isinstance(item, h5py.Group) and not exclusion_pattern.search(key):
+                group_dict[key] = {}
+                stack.append((item, group_dict[key]))
+    return ans
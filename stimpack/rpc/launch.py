@@ -1,9 +1,9 @@
-import sys, subprocess, os.path, json, atexit
+import sys, subprocess, os, json, atexit, socket, select
 
 from time import sleep, time
 from types import ModuleType
 
-from stimpack.rpc.transceiver import MySocketClient
+from stimpack.rpc.transceiver import MySocketClient, LISTENER_FD_ENV_VAR, READY_FD_ENV_VAR, READY_BYTE
 from stimpack.rpc.util import find_free_port
 
 def fullpath(file):
@@ -35,8 +35,23 @@ def launch_server(module_or_filename, new_env_vars=None, server_poll_timeout=10,
     if 'host' not in kwargs:
         kwargs['host'] = '127.0.0.1'
 
+    # On POSIX, bind the server's listening socket here and hand it to the child process.
+    # The client can then connect right away: the connection waits in the listen backlog
+    # until the server accepts it, so there is no need to poll for the server to start.
+    # Since connecting then succeeds even if the server never starts, the server instead signals on a pipe
+    # once it is listening (see transceiver.signal_server_ready).
+    listener = None
+    if os.name == 'posix':
+        try:
+            listener = socket.create_server((kwargs['host'], kwargs.get('port', 0)))
+        except OSError:
+            # e.g. the port is taken or the host is not local; let the server bind it and poll as before
+            listener = None
+
     # define port if necessary
-    if 'port' not in kwargs:
+    if listener is not None:
+        kwargs['port'] = listener.getsockname()[1]
+    elif 'port' not in kwargs:
         kwargs['port'] = find_free_port(kwargs['host'])
 
     # write options to process
@@ -49,11 +64,32 @@ def launch_server(module_or_filename, new_env_vars=None, server_poll_timeout=10,
     env.update(new_env_vars)
 
     # launch process
-    proc = subprocess.Popen(args=cmd, env=env)
+    if listener is not None:
+        ready_read, ready_write = os.pipe()
+        env[LISTENER_FD_ENV_VAR] = str(listener.fileno())
+        env[READY_FD_ENV_VAR] = str(ready_write)
+        proc = subprocess.Popen(args=cmd, env=env, pass_fds=(listener.fileno(), ready_write))
+        listener.close()
+        os.close(ready_write)
+    else:
+        env.pop(LISTENER_FD_ENV_VAR, None)
+        env.pop(READY_FD_ENV_VAR, None)
+        proc = subprocess.Popen(args=cmd, env=env)
 
     # wait for this process to terminate upon exit
     atexit.register(proc.wait)
 
+    if listener is not None:
+        # wait for the server to signal that it is listening. If it exits first (e.g. on an import error),
+        # the pipe is closed and reads as empty.
+        try:
+            ready, _, _ = select.select([ready_read], [], [], server_poll_timeout)
+            started = bool(ready) and os.read(ready_read, 1) == READY_BYTE
+        finally:
+            os.close(ready_read)
+        if not started:
+            raise Exception('Could not connect to server.')
+
     # try to establish connecting to client
     server_poll_start = time()
     while (time() - server_poll_start) < server_poll_timeout:
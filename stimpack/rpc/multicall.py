@@ -1,14 +1,23 @@
+from stimpack.rpc.util import TargetProxy
+
 class MyMultiCall:
     def __init__(self, transceiver):
         self.transceiver = transceiver
         self.request_list = []
 
+        # functions and target proxies returned by __getattr__ / target, cached by name
+        self.request_thunks = {}
+        self.target_proxies = {}
+
     def __getattr__(self, name):
-        def f(*args, **kwargs):
-            request = {'name': name, 'args': args, 'kwargs': kwargs}
-            self.request_list.append(request)
+        thunk = self.request_thunks.get(name)
+        if thunk is None:
+            def thunk(*args, **kwargs):
+                request = {'name': name, 'args': args, 'kwargs': kwargs}
+                self.request_list.append(request)
+            self.request_thunks[name] = thunk
 
-        return f
+        return thunk
 
     def __call__(self):
         self.transceiver.write_request_list(self.request_list)
@@ -17,13 +26,8 @@ class MyMultiCall:
         return str(self.request_list)
 
     def target(self, target_name):
-        class dummy_target:
-            def __getattr__(target_self, target_attr_name):
-                def g(*args, **kwargs):
-                    request = {'target': target_name, 
-                               'name': target_attr_name, 
-                               'args': args, 
-                               'kwargs': kwargs}
-                    self.request_list.append(request)
-                return g
-        return dummy_target()
\ No newline at end of file
+        proxy = self.target_proxies.get(target_name)
+        if proxy is None:
+            proxy = TargetProxy(target_name, lambda request: self.request_list.append(request))
+            self.target_proxies[target_name] = proxy
+        return proxy
\ No newline at end of file
@@ -1,18 +1,116 @@
-import socket, atexit
+import socket, atexit, struct, selectors, os, stat
 
 from queue import Queue, Empty
-from threading import Event
+from threading import Event, Lock
 from json.decoder import JSONDecodeError
 
-from stimpack.rpc.util import start_daemon_thread, stream_is_binary, JSONCoderWithTuple
+from stimpack.rpc.util import start_daemon_thread, JSONCoderWithTuple, TargetProxy, RequestEncoder
+
+# Batched request lists are sent once the send buffer grows past this many bytes
+SEND_BUFFER_THRESHOLD = 64*1024
+
+# Each request list is sent as a header followed by the JSON-encoded payload. The header holds a magic marker and
+# the wire format version, so that a peer speaking another version (e.g. the older newline-delimited JSON) is
+# detected rather than misread, and the payload length as a 4-byte little-endian integer.
+FRAME_MAGIC = b'SPK'
+FRAME_VERSION = 1
+FRAME_HEADER = struct.Struct('<3sBI')
+
+# Largest payload accepted in a single frame, in bytes
+MAX_FRAME_SIZE = 256*1024*1024
+
+# Maximum number of bytes read from the socket per wakeup
+RECV_CHUNK_SIZE = 64*1024
+
+# Seconds to wait for incoming data before checking the shutdown flag again
+SELECT_TIMEOUT = 0.5
+
+# Kernel send / receive buffer size requested for connected sockets
+SOCKET_BUFFER_SIZE = 1<<20
+
+# Environment variable through which launch_server hands a bound, listening socket to the server process
+LISTENER_FD_ENV_VAR = 'STIMPACK_LISTENER_FD'
+
+# Environment variable through which launch_server hands the write end of a pipe to the server process.
+# The server writes READY_BYTE to it once it is listening, so that launch_server can tell a server that started
+# from one that exited first.
+READY_FD_ENV_VAR = 'STIMPACK_READY_FD'
+READY_BYTE = b'\x01'
+
+def take_inherited_listener(host, port):
+    '''
+    Return the listening socket inherited from launch_server, or None if there is none or it was bound
+    to a different address than the one requested. The environment variable is removed either way,
+    so that processes launched from this one do not look for the same socket.
+    '''
+    fd = os.environ.pop(LISTENER_FD_ENV_VAR, None)
+    if fd is None:
+        return None
+
+    try:
+        listener = socket.socket(fileno=int(fd))
+    except (OSError, ValueError):
+        return None
+
+    bound_host, bound_port = listener.getsockname()[:2]
+    if (port != 0 and port != bound_port) or (host not in ('', bound_host)):
+        listener.close()
+        return None
+
+    return listener
+
+def signal_server_ready():
+    '''
+    Tell launch_server that this server is listening, by writing READY_BYTE to the pipe it handed over, if any.
+    The environment variable is removed, so that processes launched from this one do not write to the same pipe.
+    A file descriptor that is not a pipe was not opened by launch_server, and is left alone.
+    '''
+    fd = os.environ.pop(READY_FD_ENV_VAR, None)
+    if fd is None:
+        return
+
+    try:
+        fd = int(fd)
+        if not stat.S_ISFIFO(os.fstat(fd).st_mode):
+            return
+        os.write(fd, READY_BYTE)
+        os.close(fd)
+    except (OSError, ValueError):
+        pass
+
+class FrameError(Exception):
+    '''
+    Raised when data received on a connection is not a request list frame of this wire format version.
+    '''
+    pass
+
+def configure_socket(conn):
+    '''
+    Disable Nagle's algorithm so that small request lists are sent immediately,
+    and enlarge the kernel buffers so that large request lists do not stall.
+    '''
+    conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    conn.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_BUFFER_SIZE)
+    conn.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER_SIZE)
 
 class MyTransceiver:
     def __init__(self):
+        # functions and target proxies returned by __getattr__, cached by name
+        self.request_thunks = {}
+        self.target_proxies = {}
+
+        # encodes the requests made through __getattr__
+        self.request_encoder = RequestEncoder()
+
         # initialize variables
         self.functions = {}
-        self.outfile = None
+        self.conn = None
         self.queue = Queue()
 
+        # outgoing bytes not yet sent on the socket
+        self.send_buffer = bytearray()
+        self.send_lock = Lock()
+
         # create shutdown flag
         self.shutdown_flag = Event()
 
@@ -60,48 +158,129 @@ class MyTransceiver:
         self.functions[name] = function
 
     def __getattr__(self, name):
+        thunk = self.request_thunks.get(name)
+        if thunk is not None:
+            return thunk
+
         if name == 'target':
-            def f(target_name):
-                class dummy_target:
-                    def __getattr__(target_self, target_attr_name):
-                        def g(*args, **kwargs):
-                            request = {'target': target_name, 
-                                    'name': target_attr_name, 
-                                    'args': args, 
-                                    'kwargs': kwargs}
-                            self.write_request_list([request])
-                        return g
-                return dummy_target()
-            return f
+            def thunk(target_name):
+                proxy = self.target_proxies.get(target_name)
+                if proxy is None:
+                    proxy = TargetProxy(target_name, self.write_request)
+                    self.target_proxies[target_name] = proxy
+                return proxy
         else:
-            def f(*args, **kwargs):
-                request = {'name': name, 'args': args, 'kwargs': kwargs}
-                self.write_request_list([request])
+            def thunk(*args, **kwargs):
+                self.write_payload(self.request_encoder.encode(name, args, kwargs))
 
-            return f
+        self.request_thunks[name] = thunk
+        return thunk
     
     def parse_line(self, line):
-        if isinstance(line, bytes):
-            line = line.decode('utf-8')
-
         return JSONCoderWithTuple.decode(line)
 
-    def write_request_list(self, request_list):
-        if self.outfile is None:
+    def read_request_lists(self, conn):
+        '''
+        Yield request lists received on the socket until the connection is closed or shutdown is requested.
+        Each time the socket is readable, up to RECV_CHUNK_SIZE bytes are read into a rolling buffer and
+        every complete request list in the buffer is yielded before waiting again.
+        Raises FrameError if the other side does not speak this version of the wire format.
+        '''
+        buffer = bytearray()
+        with selectors.DefaultSelector() as selector:
+            selector.register(conn, selectors.EVENT_READ)
+            while not self.shutdown_flag.is_set():
+                if not selector.select(timeout=SELECT_TIMEOUT):
+                    continue
+
+                chunk = conn.recv(RECV_CHUNK_SIZE)
+                if not chunk:
+                    return
+                buffer += chunk
+
+                # pull out all complete frames
+                start = 0
+                while len(buffer) - start >= FRAME_HEADER.size:
+                    magic, version, length = FRAME_HEADER.unpack_from(buffer, start)
+                    if magic != FRAME_MAGIC or version != FRAME_VERSION:
+                        raise FrameError(f'Received data that is not a stimpack request frame of wire format version '
+                                         f'{FRAME_VERSION} (header {bytes(buffer[start:start+FRAME_HEADER.size])!r}); '
+                                         f'the other side is probably running a different version of stimpack.')
+                    if length > MAX_FRAME_SIZE:
+                        raise FrameError(f'Received a frame of {length} bytes, more than the maximum of {MAX_FRAME_SIZE}.')
+                    payload_start = start + FRAME_HEADER.size
+                    payload_end = payload_start + length
+                    if payload_end > len(buffer):
+                        break
+                    start = payload_end
+
+                    # release the view before the buffer is resized
+                    with memoryview(buffer)[payload_start:payload_end] as payload:
+                        try:
+                            request_list = self.parse_line(payload)
+                        except JSONDecodeError:
+                            continue
+                    yield request_list
+
+                del buffer[:start]
+
+    def write_request_list(self, request_list, batching=False):
+        '''
+        Send a request list to the other side with a single sendall.
+        If batching is True, the request list is held in the send buffer until the buffer grows past
+        SEND_BUFFER_THRESHOLD bytes or flush() is called, so that several request lists go out together.
+        '''
+        if self.conn is None:
             return
 
-        line = JSONCoderWithTuple.encode(request_list) + '\n'
+        self.write_payload(JSONCoderWithTuple.encode_to_bytes(request_list), batching=batching)
+
+    def write_request(self, request):
+        '''
+        Send a single request, {'target': ..., 'name': ..., 'args': ..., 'kwargs': ...}, as a request list.
+        '''
+        if self.conn is None:
+            return
 
-        if stream_is_binary(self.outfile):
-            line = line.encode('utf-8')
+        self.write_payload(self.request_encoder.encode(request['name'], request['args'], request['kwargs'],
+                                                       target=request.get('target')))
+
+    def write_payload(self, payload, batching=False):
+        '''
+        Send an encoded request list, framed with its length. See write_request_list for batching.
+        '''
+        if self.conn is None:
+            return
+
+        if len(payload) > MAX_FRAME_SIZE:
+            raise ValueError(f'Request list of {len(payload)} bytes is larger than the maximum frame size of {MAX_FRAME_SIZE}.')
+
+        with self.send_lock:
+            self.send_buffer.extend(FRAME_HEADER.pack(FRAME_MAGIC, FRAME_VERSION, len(payload)))
+            self.send_buffer.extend(payload)
+            if not batching or len(self.send_buffer) >= SEND_BUFFER_THRESHOLD:
+                self.send_buffered()
+
+    def flush(self):
+        '''
+        Send any request lists held back by write_request_list(..., batching=True).
+        '''
+        with self.send_lock:
+            self.send_buffered()
+
+    def send_buffered(self):
+        # caller must hold self.send_lock
+        if self.conn is None or len(self.send_buffer) == 0:
+            return
 
         try:
-            self.outfile.write(line)
-            self.outfile.flush()
+            self.conn.sendall(self.send_buffer)
         except BrokenPipeError:
             # will happen if the other side disconnected
             pass
 
+        self.send_buffer.clear()
+
 
 class MySocketClient(MyTransceiver):
     def __init__(self, host=None, port=None):
@@ -114,6 +293,7 @@ class MySocketClient(MyTransceiver):
         assert port is not None, 'The port must be specified when creating a client.'
 
         conn = socket.create_connection((host, port))
+        configure_socket(conn)
 
         # make sure that connection is closed on
         def cleanup():
@@ -125,20 +305,16 @@ class MySocketClient(MyTransceiver):
 
         atexit.register(cleanup)
 
-        self.infile = conn.makefile('r')
-        self.outfile = conn.makefile('wb')
+        self.conn = conn
 
         start_daemon_thread(self.loop)
 
     def loop(self):
         try:
-            for line in self.infile:
-                try:
-                    request_list = self.parse_line(line)
-                except JSONDecodeError:
-                    continue
-
+            for request_list in self.read_request_lists(self.conn):
                 self.queue.put(request_list)
+        except FrameError as e:
+            print(f'Closing connection: {e}')
         except (OSError, ConnectionResetError):
             pass
 
@@ -172,11 +348,14 @@ class MySocketServer(MyTransceiver):
         self.auto_stop = auto_stop
         self.name = name
 
-        # create the listener
-        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.listener.bind((host, port))
-        self.listener.listen()
+        # create the listener, or use the one already bound by launch_server
+        self.listener = take_inherited_listener(host, port)
+        if self.listener is None:
+            self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.listener.bind((host, port))
+            self.listener.listen()
         self.listener.settimeout(accept_timeout)
+        signal_server_ready()
 
         # print out socket information
         sockname = self.listener.getsockname()
@@ -198,20 +377,19 @@ class MySocketServer(MyTransceiver):
 
             print(f'{self.name} accepted connection from {address}.')
 
-            infile = conn.makefile('r')
-            self.outfile = conn.makefile('wb')
+            configure_socket(conn)
 
-            try:
-                for line in infile:
-                    try:
-                        request_list = self.parse_line(line)
-                    except JSONDecodeError:
-                        continue
+            self.conn = conn
 
+            try:
+                for request_list in self.read_request_lists(conn):
                     if self.threaded:
                         self.queue.put(request_list)
                     else:
                         self.handle_request_list(request_list)
+            except FrameError as e:
+                print(f'{self.name}: {e}')
+                conn.close()
             except (OSError, ConnectionResetError):
                 pass
 
@@ -1,17 +1,19 @@
-import sys, json
+import sys, json, math
 
 from collections import defaultdict
 from socket import socket
 from threading import Thread
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 def start_daemon_thread(target):
     t = Thread(target=target)
     t.daemon = True
     t.start()
 
-def stream_is_binary(stream):
-    return 'b' in stream.mode
-
 def find_free_port(host=''):
     # ref: https://stackoverflow.com/a/36331860
     s = socket()
@@ -39,25 +41,141 @@ def get_from_dict(dictionary, keys, default=None, remove=False):
             return_list.append(default)
     return return_list[0] if len(return_list) == 1 else return_list
 
+class TargetProxy:
+    """
+    Stand-in for a named target (e.g. a server module).
+    Accessing an attribute returns a function that passes a request for that target to send_request.
+    The functions are cached by name, so repeated calls reuse them.
+    """
+    def __init__(self, target_name, send_request):
+        self.target_name = target_name
+        self.send_request = send_request
+        self.thunks = {}
+
+    def __getattr__(self, name):
+        thunk = self.thunks.get(name)
+        if thunk is None:
+            target_name = self.target_name
+            send_request = self.send_request
+            def thunk(*args, **kwargs):
+                request = {'target': target_name,
+                           'name': name,
+                           'args': args,
+                           'kwargs': kwargs}
+                send_request(request)
+            self.thunks[name] = thunk
+        return thunk
+
 class JSONCoderWithTuple():
+    """
+    JSON coding that keeps tuples apart from lists. orjson is used if it is installed; the json module otherwise.
+    Both encode the same way: numpy arrays and scalars are encoded as lists and numbers (numpy datetimes as ISO 8601
+    strings), and NaN and infinity, which JSON cannot represent, are encoded as null. Anything orjson cannot encode,
+    such as integers wider than 64 bits, is encoded with the json module.
+    """
     def encode(obj):
-        def hint_tuples(item):
-            if isinstance(item, tuple):
-                return {'__tuple__': True, 'items': item}
-            if isinstance(item, list):
-                return [hint_tuples(e) for e in item]
-            if isinstance(item, dict):
-                return {key: hint_tuples(value) for key, value in item.items()}
-            else:
-                return item
+        return json.JSONEncoder(default=numpy_to_builtin).encode(null_non_finite(hint_tuples(obj)))
+
+    def encode_to_bytes(obj):
+        """
+        Encode to UTF-8 JSON bytes, using orjson if it is available.
+        """
+        if orjson is not None:
+            # numpy arrays that orjson cannot serialize itself (not C-contiguous, or of string or object dtype) are
+            # passed to numpy_to_builtin. So are Python datetimes, which it then rejects, as the json module does.
+            try:
+                return orjson.dumps(hint_tuples(obj), default=numpy_to_builtin,
+                                    option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_PASSTHROUGH_DATETIME)
+            except orjson.JSONEncodeError:
+                pass
 
-        return json.JSONEncoder().encode(hint_tuples(obj))
+        return JSONCoderWithTuple.encode(obj).encode('utf-8')
     
     def decode(obj):
+        """
+        Decode JSON given as str or as UTF-8 bytes-like object, using orjson if it is available.
+        """
+        if orjson is not None:
+            return unhint_tuples(orjson.loads(obj))
+
+        if not isinstance(obj, str):
+            obj = str(obj, 'utf-8')
+
         def hinted_tuple_hook(obj):
             if '__tuple__' in obj:
                 return tuple(obj['items'])
             else:
                 return obj
             
-        return json.loads(obj, object_hook=hinted_tuple_hook)
\ No newline at end of file
+        return json.loads(obj, object_hook=hinted_tuple_hook)
+
+class RequestEncoder:
+    """
+    Encodes a single request, {'target': ..., 'name': ..., 'args': ..., 'kwargs': ...}, as a one-element request list.
+    The part of the JSON that depends only on the target and name is encoded once and reused, so repeated calls
+    of the same function only encode their arguments. The output decodes the same as
+    JSONCoderWithTuple.encode_to_bytes([request]).
+    """
+    def __init__(self):
+        self.prefixes = {}
+
+    def encode(self, name, args, kwargs, target=None):
+        prefix = self.prefixes.get((target, name))
+        if prefix is None:
+            head = {'name': name} if target is None else {'target': target, 'name': name}
+            # drop the closing '}]' so that the arguments can be appended
+            prefix = JSONCoderWithTuple.encode_to_bytes([head])[:-2] + b',"args":'
+            self.prefixes[(target, name)] = prefix
+
+        return b''.join((prefix,
+                         JSONCoderWithTuple.encode_to_bytes(args),
+                         b',"kwargs":',
+                         JSONCoderWithTuple.encode_to_bytes(kwargs),
+                         b'}]'))
+
+def hint_tuples(item):
+    if isinstance(item, tuple):
+        return {'__tuple__': True, 'items': item}
+    if isinstance(item, list):
+        return [hint_tuples(e) for e in item]
+    if isinstance(item, dict):
+        return {key: hint_tuples(value) for key, value in item.items()}
+    else:
+        return item
+
+def null_non_finite(item):
+    # replace NaN and infinity with None, as orjson encodes them
+    if isinstance(item, float):
+        return item if math.isfinite(item) else None
+    if isinstance(item, (list, tuple)):
+        return [null_non_finite(e) for e in item]
+    if isinstance(item, dict):
+        return {key: null_non_finite(value) for key, value in item.items()}
+    else:
+        return item
+
+def numpy_to_builtin(obj):
+    # default hook for the json module, encoding numpy arrays and scalars as orjson.OPT_SERIALIZE_NUMPY does
+    if hasattr(obj, 'tolist') and type(obj).__module__ == 'numpy':
+        if obj.dtype.kind == 'M':
+            return isoformat_datetimes(obj.astype('datetime64[us]').tolist())
+        return null_non_finite(obj.tolist())
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+def isoformat_datetimes(item):
+    # ISO 8601 strings for datetimes from numpy datetime64 values, as orjson.OPT_SERIALIZE_NUMPY writes them
+    if isinstance(item, list):
+        return [isoformat_datetimes(e) for e in item]
+    return None if item is None else item.isoformat()
+
+def unhint_tuples(item):
+    # inverse of hint_tuples, for decoders without an object hook
+    if isinstance(item, list):
+        return [unhint_tuples(e) for e in item]
+    if isinstance(item, dict):
+        item = {key: unhint_tuples(value) for key, value in item.items()}
+        if '__tuple__' in item:
+            return tuple(item['items'])
+        return item
+    else:
+        return item
@@ -6,32 +6,69 @@ ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
 ICON_PATH = os.path.join(ROOT_DIR, '_assets', 'icon.png')
 
 def get_all_subclasses(cls):
-    def ordered_unique_list(seq):
-        seen = set()
-        return [x for x in seq if x not in seen and not seen.add(x)]
-    
-    return ordered_unique_list(cls.__subclasses__() + [s for c in cls.__subclasses__() for s in get_all_subclasses(c)])
+    """
+    Return all subclasses of cls, without duplicates: the direct subclasses first,
+    then the subclasses of each of those in turn, depth first.
+    """
+    all_subclasses = []
+    seen = set()
+    to_visit = [cls] # stack of classes whose subclasses have yet to be listed
+    while to_visit:
+        subclasses = [sc for sc in to_visit.pop().__subclasses__() if sc not in seen]
+        seen.update(subclasses)
+        all_subclasses.extend(subclasses)
+        to_visit.extend(reversed(subclasses))
+    return all_subclasses
+
+# {parent_class: {subclass name: subclass}}, filled on first use by make_as
+_subclass_cache = {}
+
+# {subclass: [names of required __init__ arguments]}
+_required_args_cache = {}
+
+def invalidate_subclass_cache():
+    """Forget cached subclass lookups, e.g. after loading or unloading a module that defines subclasses."""
+    _subclass_cache.clear()
+    _required_args_cache.clear()
+
+def get_subclasses_by_name(parent_class, refresh=False):
+    """Return {name: subclass} for all subclasses of parent_class. Later subclasses win on name clashes."""
+    subclasses_by_name = _subclass_cache.get(parent_class)
+    if subclasses_by_name is None or refresh:
+        subclasses = get_all_subclasses(parent_class)
+        subclasses_by_name = {}
+        for sc in subclasses:
+            if sc.__name__ in subclasses_by_name:
+                print(f'Multiple subclasses with name {sc.__name__} for parent class {parent_class.__name__}.')
+                print(f'Choosing the last one: {sc}')
+            subclasses_by_name[sc.__name__] = sc
+        _subclass_cache[parent_class] = subclasses_by_name
+    return subclasses_by_name
+
+def get_required_args(cls):
+    """Return names of the positional-or-keyword __init__ arguments of cls that have no default."""
+    required_args = _required_args_cache.get(cls)
+    if required_args is None:
+        required_args = [p.name for p in inspect.signature(cls.__init__).parameters.values()
+                         if p.name != 'self' and p.kind == p.POSITIONAL_OR_KEYWORD and p.default is p.empty]
+        _required_args_cache[cls] = required_args
+    return required_args
 
 def make_as(parameter, parent_class):
     """Return parameter as parent class object if it is a dictionary."""
     if type(parameter) is dict: # trajectory-specifying dict
-        subclasses = get_all_subclasses(parent_class)
-        subclass_names = [sc.__name__ for sc in subclasses]
-        
-        assert parameter['name'] in subclass_names, f'Unrecognized subclass name {parameter["name"]} for parent class {parent_class.__name__}.'
+        subclasses_by_name = get_subclasses_by_name(parent_class)
+        if parameter['name'] not in subclasses_by_name:
+            # subclass may have been defined since the cache was filled
+            subclasses_by_name = get_subclasses_by_name(parent_class, refresh=True)
         
-        subclass_candidates = [sc for sc in subclasses if sc.__name__ == parameter['name']]
-        if len(subclass_candidates) > 1:
-            print(f'Multiple subclasses with name {parameter["name"]} for parent class {parent_class.__name__}.')
-            print(f'Choosing the last one: {subclass_candidates[-1]}')
+        assert parameter['name'] in subclasses_by_name, f'Unrecognized subclass name {parameter["name"]} for parent class {parent_class.__name__}.'
         
-        chosen_subclass = subclass_candidates[-1]
+        chosen_subclass = subclasses_by_name[parameter['name']]
         
         # check that all required arguments are specified
-        traj_params = inspect.signature(chosen_subclass.__init__).parameters.values()
-        for p in traj_params:
-            if p.name != 'self' and p.kind == p.POSITIONAL_OR_KEYWORD and p.default is p.empty:
-                assert p.name in parameter, f'Required subclass parameter {p.name} not specified.'
+        for name in get_required_args(chosen_subclass):
+            assert name in parameter, f'Required subclass parameter {name} not specified.'
         
         # remove name parameter
         parameter.pop('name')
@@ -42,7 +79,8 @@ def make_as(parameter, parent_class):
         return parameter
 
 def listify(x, type_):
-    if isinstance(x, (list, tuple)):
+    # exact list / tuple is the common case; checked by type before the isinstance calls
+    if x.__class__ is list or x.__class__ is tuple or isinstance(x, (list, tuple)):
         return x
 
     if isinstance(x, type_):
@@ -10,7 +10,10 @@ See stimpack.visual_stim.stimuli for available child stimulus classes. Overwrite
 
 """
 
+import itertools
+
 import moderngl
+import numpy as np
 
 
 class BaseProgram:
@@ -36,20 +39,78 @@ class BaseProgram:
         self.prog = self.ctx.program(vertex_shader=self.get_vertex_shader(), fragment_shader=self.get_fragment_shader())
 
         # Initialize vertex objects
-        # 3 points, (3 for vert, 4 for color, 2 for tex_coords), 4 bytes per value
-        self.vbo_vert    = self.ctx.buffer(reserve=self.num_tri*3*3*4)
-        self.vbo_color   = self.ctx.buffer(reserve=self.num_tri*3*4*4)
-        vao_content  = [(self.vbo_vert,  '3f', 'in_vert'),
-                        (self.vbo_color, '4f', 'in_color')]
-        if self.use_texture:
-            self.vbo_texture = self.ctx.buffer(reserve=self.num_tri*3*2*4)
-            vao_content.append((self.vbo_texture, '2f', 'in_tex_coord'))
-        self.vao = self.ctx.vertex_array(program = self.prog, content = vao_content)
+        self.allocate_vertex_objects(self.num_tri)
+
+        # Mvp uniform, looked up once rather than for each subscreen on each frame,
+        # the perspective matrix last written to it for each subscreen, and the subscreen drawn last
+        self.mvp_uniform = self.prog['Mvp']
+        self.last_mvp = []
+        self.last_subscreen = 0
 
         # Default texture booleans for the shader program
         self.prog['use_texture'].value = False
         self.prog['rgb_texture'].value = False
 
+    def allocate_vertex_objects(self, num_tri):
+        """
+        Create two sets of VBOs and VAO, sized for num_tri triangles.
+        paint_at alternates between the sets on successive frames, so that writing this frame's vertex data
+        does not have to wait for the GPU to finish drawing from the buffers written on the previous frame.
+        Called once from initialize, and again from paint_at only if a stim object outgrows the buffers
+        or use_texture changes after initialization.
+
+        :param num_tri: number of triangles the buffers can hold
+        """
+        self.vertex_object_sets = []
+        for _ in range(2):
+            # 3 points, (3 for vert, 4 for color, 2 for tex_coords), 4 bytes per value
+            vbo_vert    = self.ctx.buffer(reserve=num_tri*3*3*4, dynamic=True)
+            vbo_color   = self.ctx.buffer(reserve=num_tri*3*4*4, dynamic=True)
+            vao_content  = [(vbo_vert,  '3f', 'in_vert'),
+                            (vbo_color, '4f', 'in_color')]
+            if self.use_texture:
+                vbo_texture = self.ctx.buffer(reserve=num_tri*3*2*4, dynamic=True)
+                vao_content.append((vbo_texture, '2f', 'in_tex_coord'))
+            else:
+                vbo_texture = None
+            vao = self.ctx.vertex_array(program = self.prog, content = vao_content)
+            self.vertex_object_sets.append((vbo_vert, vbo_color, vbo_texture, vao))
+
+        # arrays last written to each set, so that unchanged arrays are not uploaded again
+        self.uploaded_arrays = [(None, None, None) for _ in self.vertex_object_sets]
+
+        self.vbo_capacity = num_tri*3 # vertices
+        self.vao_use_texture = self.use_texture
+        self.vertex_set_index = 1
+        self.swap_vertex_objects()
+
+    def swap_vertex_objects(self):
+        """
+        Make the other set of vertex objects current.
+        """
+        self.vertex_set_index ^= 1
+        self.vbo_vert, self.vbo_color, self.vbo_texture, self.vao = self.vertex_object_sets[self.vertex_set_index]
+
+    def get_vertex_objects(self):
+        """
+        Return the VBOs and VAOs of all vertex object sets, flattened into one list.
+        """
+        return [obj for vertex_objects in self.vertex_object_sets for obj in vertex_objects if obj is not None]
+
+    def release_vertex_objects(self):
+        for obj in self.get_vertex_objects():
+            obj.release()
+
+    def get_gl_objects(self):
+        """
+        Return all OpenGL objects owned by this stim: vertex objects, texture and program.
+        """
+        gl_objects = self.get_vertex_objects()
+        if self.texture is not None:
+            gl_objects.append(self.texture)
+        gl_objects.append(self.prog)
+        return gl_objects
+
     def configure(self, *args, **kwargs):
         pass
 
@@ -75,25 +136,72 @@ class BaseProgram:
 
         n_vertices = vert_coords.shape[1]
 
+        # reallocate vertex objects only if they no longer fit the stim object
+        if n_vertices > self.vbo_capacity or self.use_texture != self.vao_use_texture:
+            num_tri = self.vbo_capacity // 3
+            if n_vertices > self.vbo_capacity:
+                # at least double, so that a steadily growing stim object reallocates rarely
+                num_tri = max(2*num_tri, -(-n_vertices // 3))
+            self.release_vertex_objects()
+            self.allocate_vertex_objects(num_tri)
+        else:
+            self.swap_vertex_objects()
+
         # write data to VBO
-        self.vbo_vert.write(vert_coords.flatten(order='F').astype('f4'))
-        self.vbo_color.write(colors.flatten(order='F').astype('f4'))
-        if self.use_texture:
-            self.vbo_texture.write(tex_coords.flatten(order='F').astype('f4'))
+        # The transpose of each (components, n_vertices) array is laid out vertex by vertex, as the VAO expects.
+        # ascontiguousarray converts to float32 in a single copy, and makes no copy at all if the stim object
+        # already holds float32 data in Fortran order.
+        # Arrays that are the same objects as the ones last written to this set are skipped; stim objects that
+        # stay the same between frames (or keep some of their arrays) are then not re-uploaded.
+        # Stims that modify the arrays in place must call mark_dirty() on the stim object, which forgets the arrays
+        # written to both vertex sets so that each set is written again. Stim objects that do not derive from
+        # GlVertices have no dirty flag, and are uploaded whenever they hold new arrays.
+        if getattr(self.stim_object, 'dirty', False):
+            self.uploaded_arrays = [(None, None, None) for _ in self.vertex_object_sets]
+            self.stim_object.dirty = False
+        uploaded_vert_coords, uploaded_colors, uploaded_tex_coords = self.uploaded_arrays[self.vertex_set_index]
+        if vert_coords is not uploaded_vert_coords:
+            self.vbo_vert.write(np.ascontiguousarray(vert_coords.T, dtype='f4'))
+        if colors is not uploaded_colors:
+            self.vbo_color.write(np.ascontiguousarray(colors.T, dtype='f4'))
+        if self.use_texture and tex_coords is not uploaded_tex_coords:
+            self.vbo_texture.write(np.ascontiguousarray(tex_coords.T, dtype='f4'))
+        self.uploaded_arrays[self.vertex_set_index] = (vert_coords, colors, tex_coords)
+
+        # choose the draw mode once for all subscreens
+        if self.draw_mode == 'POINTS':
+            mode = moderngl.POINTS
+            self.ctx.point_size = self.point_size
+        elif self.draw_mode == 'TRIANGLES':
+            mode = moderngl.TRIANGLES
+        else:
+            return
+
+        # forget the matrices written for the old subscreens if the number of subscreens changed
+        n_subscreens = len(viewports)
+        if len(self.last_mvp) != n_subscreens:
+            self.last_mvp = [None] * n_subscreens
+            self.last_subscreen = 0
 
         # Render to each subscreen
-        for v_ind, vp in enumerate(viewports):
-            # set the perspective matrix
-            self.prog['Mvp'].write(perspectives[v_ind])
-            # set the viewport
-            self.ctx.viewport = vp
+        # The uniform and the viewport each hold a single value, which is whatever was set for the subscreen drawn
+        # last. Drawing starts with that subscreen, so that when the perspectives are unchanged its matrix is not
+        # written again; with two subscreens, one matrix is written per frame rather than two.
+        start = self.last_subscreen
+        for i in itertools.chain(range(start, n_subscreens), range(start)):
+            vp, mvp = viewports[i], perspectives[i]
+            # set the perspective matrix (bytes-like, column-major float32), unless the uniform already holds this one
+            if mvp is not self.last_mvp[self.last_subscreen]:
+                self.mvp_uniform.write(mvp)
+            self.last_mvp[i] = mvp
+            self.last_subscreen = i
+            # set the viewport, unless it is already set; the context tracks the viewport without a GL call,
+            # and it may have been set by another stim drawn since this one
+            if self.ctx.viewport != tuple(vp):
+                self.ctx.viewport = vp
 
             # render the object
-            if self.draw_mode == 'POINTS':
-                self.vao.render(mode=moderngl.POINTS, vertices=n_vertices)
-                self.ctx.point_size=self.point_size
-            elif self.draw_mode == 'TRIANGLES':
-                self.vao.render(mode=moderngl.TRIANGLES, vertices=n_vertices)
+            self.vao.render(mode=mode, vertices=n_vertices)
 
     def add_texture_gl(self, texture_image, texture_interpolation='LINEAR'):
         # Update the texture booleans for the shader program
@@ -109,7 +217,7 @@ class BaseProgram:
 
         self.texture = self.ctx.texture(size=(texture_image.shape[1], texture_image.shape[0]),
                                         components=components,
-                                        data=texture_image.tobytes())  # size = (width, height)
+                                        data=np.ascontiguousarray(texture_image))  # size = (width, height)
 
         if texture_interpolation == 'NEAREST':
             self.texture.filter = (moderngl.NEAREST, moderngl.NEAREST)
@@ -124,7 +232,8 @@ class BaseProgram:
         self.prog.ctx.extra['n_textures_loaded'] += 1
 
     def update_texture_gl(self, texture_image):
-        self.texture.write(data=texture_image.tobytes())
+        # written straight from the array's memory; only copied if the array is not already C-contiguous
+        self.texture.write(data=np.ascontiguousarray(texture_image))
 
     def eval_at(self, t, subject_position={'x':0, 'y':0, 'z':0, 'theta':0, 'phi':0, 'roll':0}):
         """
@@ -0,0 +1,177 @@
+"""
+Frame capture for saving rendered stim movies.
+
+The display framebuffer is multisampled, so it is first resolved into a single-sample framebuffer, which can then be
+read back. If frames are to be downsampled, a shader pass averages the blue channel over blocks of pixels on the GPU,
+so that only the downsampled frame is read back.
+"""
+
+import moderngl
+import numpy as np
+
+
+class FrameCaptureProgram:
+    def __init__(self):
+        self.size = None # (width, height) of the display framebuffer
+        self.downsample_xy = None
+
+    def initialize(self, ctx):
+        """
+        :param ctx: ModernGL context
+        """
+        # save context
+        self.ctx = ctx
+
+        # create OpenGL program
+        self.prog = self.create_prog()
+
+        # create VBO and VAO for a quad filling the viewport
+        self.vbo = self.ctx.buffer(np.array([-1, -1, 1, -1, -1, 1, 1, 1]).astype('f4'))
+        self.vao = self.ctx.vertex_array(program = self.prog,
+                                         content = [(self.vbo, '2f', 'pos')],
+                                         mode = moderngl.TRIANGLE_STRIP)
+
+        # framebuffers are allocated once the display size is known
+        self.resolve_fbo = None
+        self.downsample_fbo = None
+
+        # reads just the blue channel of the resolved frame, if PyOpenGL is available
+        self.blue_channel_reader = get_blue_channel_reader()
+
+    def create_prog(self):
+        return self.ctx.program(
+            vertex_shader='''
+                #version 330
+
+                in vec2 pos;
+
+                void main() {
+                    gl_Position = vec4(pos, 0.0, 1.0);
+                }
+            ''',
+            fragment_shader='''
+                #version 330
+
+                uniform sampler2D frame;
+                uniform int factor;
+
+                out float out_value;
+
+                void main() {
+                    // Blocks are counted from the top row of the frame, and pixels past the bottom edge count as zero,
+                    // so that this matches downsampling the top-down frame on the CPU with zero padding.
+                    ivec2 size = textureSize(frame, 0);
+                    int n_rows_out = (size.y + factor - 1) / factor;
+                    int block_x = int(gl_FragCoord.x) * factor;
+                    int block_top = (n_rows_out - 1 - int(gl_FragCoord.y)) * factor;
+
+                    float total = 0.0;
+                    for (int dy = 0; dy < factor; dy++) {
+                        int y = size.y - 1 - (block_top + dy);
+                        for (int dx = 0; dx < factor; dx++) {
+                            int x = block_x + dx;
+                            if (y >= 0 && x < size.x) {
+                                total += round(texelFetch(frame, ivec2(x, y), 0).b * 255.0);
+                            }
+                        }
+                    }
+
+                    // mean of the 8-bit blue values
+                    out_value = total / float(factor * factor);
+                }
+            '''
+        )
+
+    def get_frame_layout(self, width, height, downsample_xy):
+        """
+        Return (shape, dtype) of the frames that read_into writes, as stored in memory (rows bottom to top).
+        """
+        if downsample_xy > 1:
+            return (-(-height // downsample_xy), -(-width // downsample_xy)), 'f4'
+        elif self.blue_channel_reader is not None:
+            return (height, width), 'u1'
+        else:
+            return (height, width, 4), 'u1'
+
+    def allocate(self, width, height, downsample_xy):
+        """
+        (Re)create the framebuffers for the given display size and downsampling factor.
+        """
+        self.release()
+
+        self.resolve_fbo = self.ctx.framebuffer(color_attachments=[self.ctx.texture((width, height), 4)])
+        if downsample_xy > 1:
+            shape, _ = self.get_frame_layout(width, height, downsample_xy)
+            self.downsample_fbo = self.ctx.framebuffer(color_attachments=[self.ctx.texture((shape[1], shape[0]), 1, dtype='f4')])
+
+        self.size = (width, height)
+        self.downsample_xy = downsample_xy
+
+    def release(self):
+        for fbo in [self.resolve_fbo, self.downsample_fbo]:
+            if fbo is not None:
+                for attachment in fbo.color_attachments:
+                    attachment.release()
+                fbo.release()
+        self.resolve_fbo = None
+        self.downsample_fbo = None
+
+    def read_into(self, buffer, framebuffer, width, height, downsample_xy=1):
+        """
+        Start reading the frame in framebuffer into buffer, laid out as given by get_frame_layout.
+        The read is asynchronous; the data is ready once buffer.read() returns.
+
+        :param framebuffer: display framebuffer, which is left bound on return
+        :param downsample_xy: average the blue channel over downsample_xy x downsample_xy blocks on the GPU
+        """
+        if self.size != (width, height) or self.downsample_xy != downsample_xy:
+            self.allocate(width, height, downsample_xy)
+
+        # resolve the multisampled display framebuffer
+        self.ctx.copy_framebuffer(self.resolve_fbo, framebuffer)
+
+        if downsample_xy > 1:
+            viewport = self.ctx.viewport
+            self.downsample_fbo.use()
+            self.ctx.viewport = (0, 0) + self.downsample_fbo.size
+            self.ctx.disable(moderngl.BLEND)
+
+            # bind to the last texture unit, so that the units holding stim textures are left alone
+            location = self.ctx.max_texture_units - 1
+            self.resolve_fbo.color_attachments[0].use(location=location)
+            self.prog['frame'].value = location
+            self.prog['factor'].value = downsample_xy
+            self.vao.render(mode=moderngl.TRIANGLE_STRIP)
+
+            self.ctx.enable(moderngl.BLEND)
+            self.ctx.viewport = viewport
+            self.downsample_fbo.read_into(buffer, components=1, dtype='f4')
+        elif self.blue_channel_reader is not None:
+            self.blue_channel_reader(self.resolve_fbo, buffer, width, height)
+        else:
+            self.resolve_fbo.read_into(buffer, components=4)
+
+        framebuffer.use()
+
+
+def get_blue_channel_reader():
+    """
+    Return a function that starts reading just the blue channel of a framebuffer into a moderngl buffer,
+    with glReadPixels(GL_BLUE), or None if PyOpenGL is not installed (moderngl can only read from the red channel up).
+    """
+    try:
+        import ctypes
+        from OpenGL import GL
+        from OpenGL.raw.GL.VERSION.GL_1_0 import glReadPixels
+    except ImportError:
+        return None
+
+    def read_blue_channel_into(framebuffer, buffer, width, height):
+        framebuffer.use()
+        GL.glBindBuffer(GL.GL_PIXEL_PACK_BUFFER, buffer.glo)
+        GL.glPixelStorei(GL.GL_PACK_ALIGNMENT, 1)
+        # with a pixel pack buffer bound, the last argument is an offset into it
+        glReadPixels(0, 0, width, height, GL.GL_BLUE, GL.GL_UNSIGNED_BYTE, ctypes.c_void_p(0))
+        GL.glBindBuffer(GL.GL_PIXEL_PACK_BUFFER, 0)
+
+    return read_blue_channel_into
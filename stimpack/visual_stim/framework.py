@@ -4,27 +4,47 @@ import sys
 
 import time
 import signal
+from collections import deque
+from queue import Queue
 from math import radians
 import moderngl
 
 import numpy as np
-import pandas as pd
-from skimage.transform import downscale_local_mean
 from PyQt6 import QtWidgets, QtGui
 from PyQt6.QtOpenGLWidgets import QOpenGLWidget
 
-from stimpack.util import get_all_subclasses, ICON_PATH
+from stimpack.util import get_all_subclasses, invalidate_subclass_cache, ICON_PATH
 
 from stimpack.visual_stim import stimuli
 from stimpack.visual_stim import util
-from stimpack.visual_stim.trajectory import make_as_trajectory, return_for_time_t
+from stimpack.visual_stim.trajectory import make_as_trajectory, make_batch_getter, sample_trajectory
 
-from stimpack.visual_stim.perspective import GenPerspective
+from stimpack.visual_stim.perspective import GenPerspective, pose_matrix, apply_pose
 from stimpack.visual_stim.square import SquareProgram
+from stimpack.visual_stim.capture import FrameCaptureProgram
 from stimpack.visual_stim.screen import Screen
 
 from stimpack.rpc.transceiver import MySocketServer
-from stimpack.rpc.util import get_kwargs
+from stimpack.rpc.util import get_kwargs, start_daemon_thread
+
+# Number of pixel buffers that rendered frames are read back into when saving stim frames.
+# A frame is copied out of its buffer only once this many newer reads have been started,
+# so the GPU can finish the transfer while the following frames are rendered.
+N_READBACK_BUFFERS = 3
+
+# Number of frames initially allocated for stim_frames when capturing without knowing the number of frames;
+# doubled whenever it fills up
+STIM_FRAMES_INITIAL_LENGTH = 32
+
+# Number of rows initially allocated for the position history of a stim; doubled whenever it fills up
+POS_HISTORY_INITIAL_LENGTH = 1024
+
+# Number of frame times initially allocated for profiling a stim; doubled whenever it fills up
+PROFILE_INITIAL_LENGTH = 1024
+
+# Order of the subject state variables in StimDisplay.subject_pose
+SUBJECT_POSE_KEYS = ('x', 'y', 'z', 'theta', 'phi', 'roll')
+SUBJECT_POSE_INDEX = {k: i for i, k in enumerate(SUBJECT_POSE_KEYS)}
 
 class StimDisplay(QOpenGLWidget):
     """
@@ -41,7 +61,7 @@ class StimDisplay(QOpenGLWidget):
         """
         # call super constructor
         super().__init__()
-        self.setFormat(make_qt_format(vsync=screen.vsync))
+        self.setFormat(make_qt_format(vsync=screen.vsync, samples=screen.samples))
 
         self.setWindowTitle(f'Stimpack visual_stim screen: {screen.name}' + " (EGL)" if screen.use_egl else "")
         self.setWindowIcon(QtGui.QIcon(ICON_PATH))
@@ -99,7 +119,8 @@ class StimDisplay(QOpenGLWidget):
         self.stim_start_time = None
 
         # profiling information
-        self.profile_frame_times = []
+        self.profile_frame_times = np.empty(PROFILE_INITIAL_LENGTH, dtype=np.float64) # see append_profile_frame_time
+        self.n_profile_frame_times = 0
 
         # save handles to screen and server
         self.screen = screen
@@ -107,23 +128,50 @@ class StimDisplay(QOpenGLWidget):
         self.app = app
 
         # Initialize stuff for rendering & saving stim frames
-        self.stim_frames = []
+        self.stim_frames = np.empty((0, 0, 0), dtype=np.uint8) # see get_stim_frame_slot
+        self.n_stim_frames = 0 # number of frames stored in stim_frames
+        self.n_stim_frames_expected = None # known when pre-rendering; stim_frames is then allocated for exactly this many
         self.append_stim_frames = False
         self.pre_render = False
         self.current_time_index = None
 
+        # pixel buffers for reading back rendered frames; allocated on first use
+        self.readback_buffers = []
+        self.pending_readbacks = deque() # (buffer, frame shape, dtype) for reads not yet copied into stim_frames
+        self.frame_capture = FrameCaptureProgram()
+        self.stim_frames_downsample_xy = 1 # downsampling applied on the GPU while capturing
+
+        # frame bytes copied out of the pixel buffers are converted and appended to stim_frames on a separate thread
+        self.readback_queue = Queue(maxsize=4)
+        start_daemon_thread(self.readback_worker)
+
         # Initalize stuff for saving position history
         self.save_pos_history = False
         self.save_pos_history_dir = None
-        self.pos_history = []
+        self.pos_history = np.empty((0, 5), dtype=np.float64) # rows of x, y, z, theta, phi; see append_pos_history
+        self.pos_history_len = 0 # number of rows of pos_history in use
 
         # make program for rendering the corner square
         self.square_program = SquareProgram(screen=screen)
 
+        # display size in pixels and the viewports that depend on it; updated in resizeGL
+        self.display_size = None
+        self.framebuffer = None # moderngl wrapper for the widget's framebuffer
+        self.subscreen_viewports = [None] * len(screen.subscreens) # overwritten in place
+
         # initialize background color
         self.idle_background = (0.5, 0.5, 0.5, 1.0)
         
+        # projection for each subscreen, which depends only on its geometry; see get_subscreen_perspectives
+        self.subscreen_projections = [GenPerspective(pa=sub.pa, pb=sub.pb, pc=sub.pc, horizontal_flip=screen.horizontal_flip).projection
+                                      for sub in screen.subscreens]
+        self.subscreen_perspectives = [None] * len(screen.subscreens) # overwritten in place
+        self.subscreen_perspectives_dirty = True # set when the subject pose changes
+        self.perspective_scratch = np.empty((4, 4), dtype=np.float64) # intermediate product for apply_pose
+
         # initialize subject state (e.g. position)
+        # subject_pose holds the values in SUBJECT_POSE_KEYS order; subject_position has the same values by name, for stims
+        self.subject_pose = np.zeros(len(SUBJECT_POSE_KEYS), dtype=np.float64)
         self.subject_position = {}
         self.set_subject_state({'x': 0, 'y': 0, 'z': 0, 'theta': 0, 'phi': 0, 'roll': 0}) # meters and degrees
 
@@ -131,10 +179,15 @@ class StimDisplay(QOpenGLWidget):
         self.subject_x_trajectory = None
         self.subject_y_trajectory = None
         self.subject_theta_trajectory = None
+        self.get_subject_trajectory_values = None
+        self.pre_render_subject_trajectory = None # x, y, theta at each pre-render timepoint; see get_pre_render_subject_trajectory
         
         # imported stimuli module names
         self.imported_stim_module_names = []
 
+        # {name: [stim classes with that name]}, filled on the first load_stim and cleared when stim modules change
+        self.stim_classes_by_name = None
+
     def initializeGL(self):
          # get OpenGL context
         if self.screen.use_egl:
@@ -221,8 +274,59 @@ class StimDisplay(QOpenGLWidget):
         # initialize square program
         self.square_program.initialize(self.ctx)
 
+        # initialize frame capture program
+        self.frame_capture.initialize(self.ctx)
+
+        # set viewports for the first frame; resizeGL updates them after that
+        self.update_display_size()
+
         self.frame_count = 0
 
+    def get_subscreen_perspectives(self):
+        """
+        Return the perspective matrix of each subscreen for the current subject position.
+        The part that depends only on the subscreen geometry is computed once, and the matrices are
+        recomputed only when set_subject_state has changed the subject pose since the last call.
+        """
+        if self.subscreen_perspectives_dirty:
+            x, y, z, theta, phi, roll = self.subject_pose.tolist()
+            # the rotation and translation for the subject pose are shared by all subscreens
+            pose = pose_matrix(x, y, z, radians(theta), radians(phi), radians(roll))
+            for i, projection in enumerate(self.subscreen_projections):
+                self.subscreen_perspectives[i] = apply_pose(projection, pose, out=self.perspective_scratch)
+            self.subscreen_perspectives_dirty = False
+        return self.subscreen_perspectives
+
+    def get_pre_render_subject_trajectory(self):
+        """
+        Return the subject trajectory sampled at all pre-render timepoints, as an (n_timepoints, 3) array of x, y, theta.
+        Computed on first use after the trajectory or the timepoints are set.
+        """
+        if self.pre_render_subject_trajectory is None:
+            stim_times = [self.get_stim_time(t) for t in self.pre_render_timepoints]
+            self.pre_render_subject_trajectory = np.stack([sample_trajectory(trajectory, stim_times)
+                                                           for trajectory in [self.subject_x_trajectory,
+                                                                              self.subject_y_trajectory,
+                                                                              self.subject_theta_trajectory]], axis=1)
+        return self.pre_render_subject_trajectory
+
+    def resizeGL(self, width, height):
+        self.update_display_size()
+        self.framebuffer = None # Qt recreates the widget's framebuffer on resize; detected again in paintGL
+
+    def update_display_size(self):
+        """
+        Get the display size in pixels and set the subscreen and corner square viewports for it.
+        """
+        display_width = self.width()*self.devicePixelRatio()
+        display_height = self.height()*self.devicePixelRatio()
+        self.display_size = (display_width, display_height)
+
+        for i, sub in enumerate(self.screen.subscreens):
+            self.subscreen_viewports[i] = sub.get_viewport(display_width, display_height)
+        # Get viewport for corner square
+        self.square_program.set_viewport(display_width, display_height)
+
     def get_stim_time(self, t):
         stim_time = 0
 
@@ -231,16 +335,22 @@ class StimDisplay(QOpenGLWidget):
 
         return stim_time
 
-    def clear_viewports(self, color=None, viewports=None):
+    def clear_viewports(self, color=None, viewports=None, framebuffer=None):
+        """
+        :param framebuffer: framebuffer to clear; defaults to ctx.fbo. paintGL passes the one it is drawing to.
+        """
         if color is None:
             color = self.idle_background
         assert len(color) == 4, 'ERROR: color must be a tuple of length 4 (RGBA)'
         
         if not isinstance(viewports, list):
             viewports = [viewports]
-        
+
+        if framebuffer is None:
+            framebuffer = self.ctx.fbo
+        red, green, blue, alpha = color
         for viewport in viewports:
-            self.ctx.fbo.clear(red=color[0], green=color[1], blue=color[2], alpha=color[3], viewport=viewport)
+            framebuffer.clear(red=red, green=green, blue=blue, alpha=alpha, viewport=viewport)
         
     def paintGL(self):
         # t0 = time.time() # benchmarking
@@ -253,18 +363,17 @@ class StimDisplay(QOpenGLWidget):
         # handle RPC input
         self.server.process_queue()
 
-        # get display size and set viewports
-        display_width = self.width()*self.devicePixelRatio()
-        display_height = self.height()*self.devicePixelRatio()
-
-        self.subscreen_viewports = [sub.get_viewport(display_width, display_height) for sub in self.screen.subscreens]
-        # Get viewport for corner square
-        self.square_program.set_viewport(display_width, display_height)
+        # display size and viewports, as set in initializeGL and resizeGL
+        display_width, display_height = self.display_size
 
-        self.ctx.detect_framebuffer().use()
+        # the widget's framebuffer only changes when it is resized
+        if self.framebuffer is None:
+            self.framebuffer = self.ctx.detect_framebuffer()
+        framebuffer = self.framebuffer
+        framebuffer.use()
 
         # clear the previous frame across the whole display
-        self.clear_viewports(color=(0,0,0,1), viewports=None)
+        self.clear_viewports(color=(0,0,0,1), viewports=None, framebuffer=framebuffer)
 
         # draw the stimulus
         if self.stim_list:
@@ -275,28 +384,30 @@ class StimDisplay(QOpenGLWidget):
                     t = self.pre_render_timepoints[-1]
                     self.stop_stim()
             else:  # real-time generation
-                t = time.time()
+                t = time.monotonic() # same clock as the t passed to start_stim by the stim server
             if self.use_subject_trajectory:
-                self.set_subject_state({'x': return_for_time_t(self.subject_x_trajectory, self.get_stim_time(t)),
-                                        'y': return_for_time_t(self.subject_y_trajectory, self.get_stim_time(t)),
-                                        'theta': return_for_time_t(self.subject_theta_trajectory, self.get_stim_time(t)) # deg -> radians
-                                        })
+                if self.pre_render:
+                    x, y, theta = self.get_pre_render_subject_trajectory()[self.current_time_index]
+                else:
+                    x, y, theta = self.get_subject_trajectory_values(self.get_stim_time(t))
+                self.set_subject_state({'x': x, 'y': y, 'theta': theta})
 
             # For each subscreen associated with this screen: get the perspective matrix
-            perspectives = [get_perspective(self.subject_position, x.pa, x.pb, x.pc, self.screen.horizontal_flip) for x in self.screen.subscreens]
+            perspectives = self.get_subscreen_perspectives()
 
-            for stim in self.stim_list:
-                if self.stim_started:
-                    stim.paint_at(self.get_stim_time(t),
+            if self.stim_started:
+                stim_time = self.get_stim_time(t)
+                for stim in self.stim_list:
+                    stim.paint_at(stim_time,
                                   self.subscreen_viewports,
                                   perspectives,
                                   subject_position=self.subject_position)
-                else: # Clear when there is stim loaded but not started (pre-time for the most part)
-                    self.clear_viewports(color=self.idle_background, viewports=self.subscreen_viewports)
+            else: # Clear when there is stim loaded but not started (pre-time for the most part); once for all stims
+                self.clear_viewports(color=self.idle_background, viewports=self.subscreen_viewports, framebuffer=framebuffer)
 
-            self.profile_frame_times.append(t)
+            self.append_profile_frame_time(t)
         else: # Clear when there is no stim loaded (tail-time and when on standby)
-            self.clear_viewports(color=self.idle_background, viewports=self.subscreen_viewports)
+            self.clear_viewports(color=self.idle_background, viewports=self.subscreen_viewports, framebuffer=framebuffer)
 
         # draw the corner square
         self.square_program.paint()
@@ -307,20 +418,111 @@ class StimDisplay(QOpenGLWidget):
                 print(f'{self.frame_count} OpenGL Error: {error}')
 
         # update the window
-        self.ctx.finish()
+        # flush rather than finish: Qt synchronizes when it composites the frame, and frame readbacks go through
+        # pixel buffers that are only read several frames later, so there is no need to wait for the GPU here
+        self.ctx.flush()
         self.update()
 
         if self.stim_started:
             # print('paintGL {:.2f} ms'.format((time.time()-t0)*1000)) #benchmarking
 
             if self.save_pos_history:
-                self.pos_history.append([self.subject_position['x'], self.subject_position['y'], self.subject_position['z'], self.subject_position['theta'], self.subject_position['phi']])
+                self.append_pos_history()
 
             if self.append_stim_frames:
-                # grab frame buffer, convert to array, grab blue channel, append to list of stim_frames
-                self.stim_frames.append(util.qimage2ndarray(self.grabFrameBuffer())[:, :, 2])
+                # start reading back the frame; its blue channel is appended to stim_frames a few frames later
+                self.read_frame_async(framebuffer, int(display_width), int(display_height))
                 self.current_time_index += 1
 
+    def read_frame_async(self, framebuffer, width, height):
+        """
+        Start reading the rendered frame from framebuffer into a pixel buffer, without waiting for it.
+        See FrameCaptureProgram for what is read.
+        Once N_READBACK_BUFFERS reads are pending, the oldest one is copied into stim_frames first.
+        """
+        shape, dtype = self.frame_capture.get_frame_layout(width, height, self.stim_frames_downsample_xy)
+        size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        if not self.readback_buffers or self.readback_buffers[0].size != size:
+            self.collect_pending_frames()
+            for buffer in self.readback_buffers:
+                buffer.release()
+            self.readback_buffers = [self.ctx.buffer(reserve=size, dynamic=True) for _ in range(N_READBACK_BUFFERS)]
+
+        if len(self.pending_readbacks) == N_READBACK_BUFFERS:
+            self.collect_frame(*self.pending_readbacks.popleft())
+
+        pending_buffers = [pending[0] for pending in self.pending_readbacks]
+        buffer = next(b for b in self.readback_buffers if not any(b is p for p in pending_buffers))
+        self.frame_capture.read_into(buffer, framebuffer, width, height, downsample_xy=self.stim_frames_downsample_xy)
+        self.pending_readbacks.append((buffer, shape, dtype))
+
+    def collect_frame(self, buffer, shape, dtype):
+        """
+        Copy a frame read back by read_frame_async out of its pixel buffer. A frame that is already just the blue
+        channel in uint8 is read straight into stim_frames; anything else is passed to readback_worker to be converted.
+        """
+        if len(shape) == 2 and np.dtype(dtype) == np.uint8:
+            slot = self.get_stim_frame_slot(shape)
+            if slot is not None:
+                buffer.read_into(slot)
+        else:
+            self.readback_queue.put((buffer.read(), shape, dtype))
+
+    def readback_worker(self):
+        """
+        Append the blue channel of each frame from readback_queue to stim_frames, in order.
+        """
+        while True:
+            data, shape, dtype = self.readback_queue.get()
+            try:
+                frame = np.frombuffer(data, dtype=dtype).reshape(shape)
+                if frame.ndim == 3:
+                    frame = frame[:, :, 2] # RGBA read; keep blue
+                slot = self.get_stim_frame_slot(frame.shape)
+                if slot is not None:
+                    slot[...] = frame # block means from GPU downsampling are truncated to uint8
+            finally:
+                self.readback_queue.task_done()
+
+    def get_stim_frame_slot(self, shape):
+        """
+        Return the entry of stim_frames that the next frame of the given (height, width) is to be stored in,
+        or None if the frame has to be dropped.
+
+        stim_frames is an (n, height, width) uint8 array, with rows stored in OpenGL order (bottom to top).
+        It is preallocated for the expected number of frames when that is known, and otherwise doubled in length
+        whenever it fills up.
+        """
+        n = self.n_stim_frames
+        if n == 0:
+            n_rows = self.n_stim_frames_expected or STIM_FRAMES_INITIAL_LENGTH
+            self.stim_frames = np.empty((n_rows,) + tuple(shape), dtype=np.uint8)
+        elif tuple(shape) != self.stim_frames.shape[1:]:
+            print(f'Warning: display was resized while appending stim frames; dropping frame of shape {shape}')
+            return None
+        elif n == len(self.stim_frames):
+            # more frames than expected, or number of frames not known
+            self.stim_frames = grow_array(self.stim_frames, n, STIM_FRAMES_INITIAL_LENGTH)
+
+        self.n_stim_frames += 1
+        return self.stim_frames[n]
+
+    def get_stim_frames(self):
+        """
+        Return the stored stim frames as one (n_frames, height, width) uint8 array, with the top row of the display first.
+        This is a view of stim_frames with its rows flipped, not a copy.
+        """
+        self.collect_pending_frames()
+        return self.stim_frames[:self.n_stim_frames, ::-1]
+
+    def collect_pending_frames(self):
+        """
+        Copy all frames still waiting in pixel buffers into stim_frames, and wait until they have been appended.
+        """
+        while self.pending_readbacks:
+            self.collect_frame(*self.pending_readbacks.popleft())
+        self.readback_queue.join()
+
     ###########################################
     # control functions
     ###########################################
@@ -335,6 +537,23 @@ class StimDisplay(QOpenGLWidget):
         self.subject_x_trajectory = make_as_trajectory(x_trajectory)
         self.subject_y_trajectory = make_as_trajectory(y_trajectory)
         self.subject_theta_trajectory = make_as_trajectory(theta_trajectory)
+        # x, y, theta are looked up together each frame
+        self.get_subject_trajectory_values = make_batch_getter([self.subject_x_trajectory,
+                                                                self.subject_y_trajectory,
+                                                                self.subject_theta_trajectory])
+        self.pre_render_subject_trajectory = None
+
+    def get_stim_class_candidates(self, name):
+        """
+        Return the list of stim classes (subclasses of BaseProgram) with the given name.
+        Looked up in stim_classes_by_name, which is rebuilt if it is unset or has no entry for name,
+        so that stim classes defined since it was built are found too.
+        """
+        if self.stim_classes_by_name is None or name not in self.stim_classes_by_name:
+            self.stim_classes_by_name = {}
+            for stim_class in get_all_subclasses(stimuli.BaseProgram):
+                self.stim_classes_by_name.setdefault(stim_class.__name__, []).append(stim_class)
+        return self.stim_classes_by_name.get(name, [])
 
     def load_stim(self, name, hold=False, **kwargs):
         """
@@ -346,8 +565,7 @@ class StimDisplay(QOpenGLWidget):
         if hold is False:
             self.stim_list = []
 
-        stim_classes = get_all_subclasses(stimuli.BaseProgram)
-        stim_class_candidates = [x for x in stim_classes if x.__name__ == name]
+        stim_class_candidates = self.get_stim_class_candidates(name)
         num_candidates = len(stim_class_candidates)
         
         assert num_candidates == 1, 'ERROR: {} stimulus candidates found with name {}. There should be exactly one'.format(num_candidates, name)
@@ -359,23 +577,36 @@ class StimDisplay(QOpenGLWidget):
         stim.configure(**stim.kwargs) # Configure stim on load
         self.stim_list.append(stim)
         
-    def start_stim(self, t, append_stim_frames=False, pre_render=False, pre_render_timepoints=None):
+    def start_stim(self, t, append_stim_frames=False, pre_render=False, pre_render_timepoints=None, capture_downsample_xy=1):
         """
         Start the stimulus animation, using the given time as t=0.
 
-        :param t: Time corresponding to t=0 of the animation
+        :param t: Time corresponding to t=0 of the animation, from time.monotonic() (as stamped by the stim server)
         :param append_stim_frames: bool, append frames to stim_frames list, for saving stim movie. May affect performance.
+        :param capture_downsample_xy: int, downsample appended frames by this factor on the GPU before reading them back.
+            Reads back far less data; save_rendered_movie then only downsamples by what remains of its own factor.
         """
         self.clear_profile()
 
-        self.stim_frames = []
+        self.pending_readbacks.clear()
+        self.readback_queue.join()
+        self.stim_frames = np.empty((0, 0, 0), dtype=np.uint8)
+        self.n_stim_frames = 0
+        if append_stim_frames and pre_render and pre_render_timepoints is not None:
+            self.n_stim_frames_expected = len(pre_render_timepoints)
+        else:
+            self.n_stim_frames_expected = None
         self.append_stim_frames = append_stim_frames
+        self.stim_frames_downsample_xy = max(int(capture_downsample_xy), 1)
         self.pre_render = pre_render
         self.current_time_index = 0
         self.pre_render_timepoints = pre_render_timepoints
+        self.pre_render_subject_trajectory = None
 
         if self.save_pos_history:
-            self.pos_history = []
+            n_rows = len(pre_render_timepoints) if pre_render and pre_render_timepoints is not None else POS_HISTORY_INITIAL_LENGTH
+            self.pos_history = np.empty((max(n_rows, 1), 5), dtype=np.float64)
+            self.pos_history_len = 0
 
         self.stim_started = True
         if pre_render:
@@ -387,18 +618,20 @@ class StimDisplay(QOpenGLWidget):
         """
         Stops the stimulus animation and removes it from the display.
         """
+        # finish reading back any rendered frames still in flight
+        self.collect_pending_frames()
+
         # clear texture
         self.ctx.clear_samplers()
         self.ctx.extra['n_textures_loaded'] = 0
 
+        # collect the GL objects of all stims, then release them together
+        gl_objects = []
         for stim in self.stim_list:
-            stim.vbo_vert.release()
-            stim.vbo_color.release()
-            if stim.use_texture:
-                stim.vbo_texture.release()
-            stim.vao.release()
-            stim.prog.release()
+            gl_objects.extend(stim.get_gl_objects())
             stim.destroy()
+        for obj in gl_objects:
+            obj.release()
 
         # print profiling information if applicable
         if print_profile:
@@ -416,9 +649,10 @@ class StimDisplay(QOpenGLWidget):
         self.subject_x_trajectory = None
         self.subject_y_trajectory = None
         self.subject_theta_trajectory = None
+        self.get_subject_trajectory_values = None
+        self.pre_render_subject_trajectory = None
         
         self.set_subject_state({'x': 0, 'y': 0, 'z': 0, 'theta': 0, 'phi': 0, 'roll': 0})
-        self.perspective = get_perspective(self.subject_position, self.screen.subscreens[0].pa, self.screen.subscreens[0].pb, self.screen.subscreens[0].pc, self.screen.horizontal_flip)
 
     def update_stim(self, t, **kwargs):
         for stim in self.stim_list:
@@ -428,21 +662,39 @@ class StimDisplay(QOpenGLWidget):
         """
         Clear profiling information for the last stimulus.
         """
-        self.profile_frame_times = []
+        self.n_profile_frame_times = 0
+
+    def append_profile_frame_time(self, t):
+        """
+        Append the time of a painted frame to profile_frame_times, doubling its size if it is full.
+        """
+        if self.n_profile_frame_times == len(self.profile_frame_times):
+            self.profile_frame_times = grow_array(self.profile_frame_times, self.n_profile_frame_times, PROFILE_INITIAL_LENGTH)
+        self.profile_frame_times[self.n_profile_frame_times] = t
+        self.n_profile_frame_times += 1
 
     def print_profile(self):
         """
         Print profiling information for the last stimulus.
         """
         # filter out frame times of duration zero
-        fps_data = np.diff(np.array(self.profile_frame_times))
+        fps_data = np.diff(self.profile_frame_times[:self.n_profile_frame_times])
         fps_data = fps_data[fps_data != 0]
 
         if len(fps_data) > 0:
-            fps_data = pd.Series(1.0/fps_data)
+            fps_data = 1.0/fps_data
             stim_names = ', '.join([type(stim).__name__ for stim in self.stim_list])
             print(f'*** {self.screen.name}: {stim_names} ***')
-            print(fps_data.describe(percentiles=[0.01, 0.05, 0.1, 0.9, 0.95, 0.99]))
+            # same summary as pandas' Series.describe
+            percentiles = [1, 5, 10, 50, 90, 95, 99]
+            std = np.std(fps_data, ddof=1) if len(fps_data) > 1 else np.nan
+            print(f'{"count":<6}{len(fps_data):>12.6f}')
+            print(f'{"mean":<6}{np.mean(fps_data):>12.6f}')
+            print(f'{"std":<6}{std:>12.6f}')
+            print(f'{"min":<6}{np.min(fps_data):>12.6f}')
+            for p, value in zip(percentiles, np.percentile(fps_data, percentiles)):
+                print(f'{f"{p}%":<6}{value:>12.6f}')
+            print(f'{"max":<6}{np.max(fps_data):>12.6f}')
             print('*** end of statistics ***')
         
     def save_rendered_movie(self, file_path, downsample_xy=4):
@@ -452,12 +704,31 @@ class StimDisplay(QOpenGLWidget):
 
         :param file_path: full file path of saved array
         """
-        print('shape is {}'.format(len(self.stim_frames)))
-        pre_size = np.stack(self.stim_frames, axis=2).shape
-        mov = downscale_local_mean(np.stack(self.stim_frames, axis=2), factors=(downsample_xy, downsample_xy, 1)).astype('uint8')
+        stim_frames = self.get_stim_frames() # (n_frames, height, width)
+        print('shape is {}'.format(len(stim_frames)))
+        pre_size = stim_frames.shape[1:] + stim_frames.shape[:1]
+
+        # frames may already have been downsampled on the GPU while capturing
+        if downsample_xy % self.stim_frames_downsample_xy != 0:
+            print(f'Warning: frames were captured downsampled by {self.stim_frames_downsample_xy}, '
+                  f'which does not divide downsample_xy={downsample_xy}; not downsampling further.')
+            remaining_downsample_xy = 1
+        else:
+            remaining_downsample_xy = downsample_xy // self.stim_frames_downsample_xy
+        mov = downsample_frames(stim_frames, remaining_downsample_xy)
+        mov = np.moveaxis(mov, 0, 2) # saved as (height, width, n_frames)
         np.save(file_path, mov)
         print('Downsampled from {} to {} and saved to {}'.format(pre_size, mov.shape, file_path), flush=True)
 
+    def append_pos_history(self):
+        """
+        Append the current x, y, z, theta, phi of the subject to pos_history, doubling its size if it is full.
+        """
+        if self.pos_history_len == len(self.pos_history):
+            self.pos_history = grow_array(self.pos_history, self.pos_history_len, POS_HISTORY_INITIAL_LENGTH)
+        self.pos_history[self.pos_history_len] = self.subject_pose[:SUBJECT_POSE_INDEX['roll']]
+        self.pos_history_len += 1
+
     def set_save_pos_history_flag(self, flag=True):
         self.save_pos_history = flag
         
@@ -465,13 +736,17 @@ class StimDisplay(QOpenGLWidget):
         self.save_pos_history_dir = os.path.join(save_dir, '_'.join(['screen', self.screen.name]))
         os.makedirs(self.save_pos_history_dir, exist_ok=True)
 
-    def save_pos_history_to_file(self, epoch_id):
+    def save_pos_history_to_file(self, epoch_id, binary=True):
         '''
-        Save the position history for the stim to a text file.
+        Save the position history for the stim to a file: a .npy array if binary, else a text file (.out) as written by np.savetxt.
         '''
         if self.save_pos_history_dir is not None:
-            file_path = os.path.join(self.save_pos_history_dir, '_'.join(['epoch', epoch_id])+'.out')
-            np.savetxt(file_path, np.asarray(self.pos_history))
+            file_name = '_'.join(['epoch', epoch_id])
+            pos_history = self.pos_history[:self.pos_history_len]
+            if binary:
+                np.save(os.path.join(self.save_pos_history_dir, file_name+'.npy'), pos_history)
+            else:
+                np.savetxt(os.path.join(self.save_pos_history_dir, file_name+'.out'), pos_history)
 
     def corner_square_toggle_start(self):
         """
@@ -534,14 +809,35 @@ class StimDisplay(QOpenGLWidget):
     def set_subject_state(self, state_update):
         # Update the subject state (only position for this module)
         for k,v in state_update.items():
-            if k in ['x', 'y', 'z', 'theta', 'phi', 'roll']:
-                self.subject_position[k] = float(v)
+            i = SUBJECT_POSE_INDEX.get(k)
+            if i is not None:
+                v = float(v)
+                if v != self.subject_pose.item(i):
+                    self.subject_pose[i] = v
+                    self.subscreen_perspectives_dirty = True
+                self.subject_position[k] = v
+
+    def set_subject_pose(self, pose):
+        """
+        Set the whole subject state at once, without building a dict for set_subject_state.
+
+        :param pose: sequence of x, y, z (meters), theta, phi, roll (degrees), in SUBJECT_POSE_KEYS order
+        """
+        pose = np.asarray(pose, dtype=np.float64)
+        if pose.shape != self.subject_pose.shape:
+            raise ValueError(f'pose must have {len(SUBJECT_POSE_KEYS)} values: {", ".join(SUBJECT_POSE_KEYS)}')
+        if not np.array_equal(pose, self.subject_pose):
+            np.copyto(self.subject_pose, pose)
+            self.subscreen_perspectives_dirty = True
+            self.subject_position.update(zip(SUBJECT_POSE_KEYS, self.subject_pose.tolist()))
         
     def import_stim_module(self, path):
         # Load other stim modules from paths containing subclasses of stimpack.visual_stim.stimuli.BaseProgram
         barcode = util.generate_lowercase_barcode(length=10, existing_barcodes=self.imported_stim_module_names)
         util.load_stim_module_from_path(path, barcode)
         self.imported_stim_module_names.append(barcode)
+        invalidate_subclass_cache()
+        self.stim_classes_by_name = None
         print(f'Loaded stim module from {path} with key {barcode}')
     
     def unload_stim_module(self, barcodes=None):
@@ -558,9 +854,12 @@ class StimDisplay(QOpenGLWidget):
             else:
                 # Unload the submodules associated with each barcode from sys.modules
                 submodule_names = [x for x in sys.modules.keys() if x.startswith(barcode)]
-                [util.unload_module(x) for x in submodule_names]
+                for x in submodule_names:
+                    util.unload_module(x)
                 self.imported_stim_module_names.remove(barcode)
                 print(f'Unloaded stim module with key {barcode}')
+        invalidate_subclass_cache()
+        self.stim_classes_by_name = None
         
 def get_perspective(subject_pos, pa, pb, pc, horizontal_flip):
     """
@@ -573,9 +872,7 @@ def get_perspective(subject_pos, pa, pb, pc, horizontal_flip):
     :param horizontal_flip: Boolean, apply horizontal flip to image, for rear-projection displays
     """
     x, y, z = subject_pos['x'], subject_pos['y'], subject_pos['z']
-    perspective = GenPerspective(pa=pa, pb=pb, pc=pc, 
-                                 subject_xyz=(x,y,z), 
-                                 horizontal_flip=horizontal_flip)
+    projection = GenPerspective(pa=pa, pb=pb, pc=pc, horizontal_flip=horizontal_flip).projection
 
     """
     With (theta, phi, roll) = (0, 0, 0): subject looks down +y axis, +x is to the right, and +z is above the subject's head
@@ -589,13 +886,51 @@ def get_perspective(subject_pos, pa, pb, pc, horizontal_flip):
 
     """
     theta, phi, roll = subject_pos['theta'], subject_pos['phi'], subject_pos.get('roll', 0)
-    return perspective.rotz(radians(theta)).rotx(radians(phi)).roty(radians(roll)).matrix
+    # same bytes as GenPerspective(..., subject_xyz=(x, y, z)).rotz(theta).rotx(phi).roty(roll).matrix,
+    # with the rotations applied as one matrix rather than to the screen corners
+    pose = pose_matrix(float(x), float(y), float(z), radians(theta), radians(phi), radians(roll))
+    return apply_pose(projection, pose).tobytes()
 
 
-def make_qt_format(vsync):
+def grow_array(array, n_used, min_length):
+    """
+    Return a copy of array that is twice as long (and at least min_length) along the first axis,
+    with its first n_used entries copied over.
+    """
+    grown = np.empty((max(2*len(array), min_length),) + array.shape[1:], dtype=array.dtype)
+    grown[:n_used] = array[:n_used]
+    return grown
+
+def downsample_frames(frames, factor, chunk_size=64):
+    """
+    Average non-overlapping factor x factor blocks of each frame in a (n_frames, height, width) uint8 array,
+    rounding down to uint8. Frames whose size is not a multiple of factor are padded with zeros,
+    as in skimage's downscale_local_mean.
+    Blocks are summed with an integer accumulator, chunk_size frames at a time, so no full-size
+    floating point (or padded) copy of the movie is made.
+    """
+    if factor == 1:
+        return frames
+
+    n_frames, height, width = frames.shape
+    pad_y, pad_x = -height % factor, -width % factor
+    out_height, out_width = (height + pad_y) // factor, (width + pad_x) // factor
+    acc_dtype = np.uint16 if 255 * factor**2 <= np.iinfo(np.uint16).max else np.uint32
+
+    downsampled = np.empty((n_frames, out_height, out_width), dtype=np.uint8)
+    for start in range(0, n_frames, chunk_size):
+        chunk = frames[start:start+chunk_size]
+        if pad_y or pad_x:
+            chunk = np.pad(chunk, ((0, 0), (0, pad_y), (0, pad_x)))
+        blocks = chunk.reshape(len(chunk), out_height, factor, out_width, factor)
+        downsampled[start:start+len(chunk)] = blocks.sum(axis=(2, 4), dtype=acc_dtype) // factor**2
+    return downsampled
+
+def make_qt_format(vsync, samples=4):
     """
     Initializes the Qt OpenGL format.
     :param vsync: If True, use VSYNC, otherwise update as fast as possible
+    :param samples: number of samples per pixel for multisample anti-aliasing; 1 for none
     """
 
     # create format with default settings
@@ -611,8 +946,10 @@ def make_qt_format(vsync):
     else:
         format.setSwapInterval(0)
 
+    # multisample anti-aliasing; each sample multiplies the framebuffer memory and bandwidth
+    format.setSamples(samples)
+
     # TODO: determine what these lines do and whether they are necessary
-    format.setSamples(24)
     format.setDepthBufferSize(24)
 
     # needed to enable transparency
@@ -664,6 +1001,7 @@ def main():
     server.register_function(stim_display.hide_corner_square)
     server.register_function(stim_display.set_idle_background)
     server.register_function(stim_display.set_subject_state)
+    server.register_function(stim_display.set_subject_pose)
     server.register_function(stim_display.set_save_pos_history_flag)
     server.register_function(stim_display.set_save_pos_history_dir)
     server.register_function(stim_display.save_pos_history_to_file)
@@ -5,6 +5,8 @@ See:
 https://csc.lsu.edu/~kooima/articles/genperspective/index.html
 """
 
+from functools import cached_property
+
 import numpy as np
 
 from stimpack.visual_stim.util import normalize, rotx, roty, rotz
@@ -24,12 +26,23 @@ class GenPerspective:
 
     @property
     def matrix(self):
+        T = translation_matrix(self.subject_xyz)
+
+        return self.projection.dot(T).astype('f4').tobytes(order='F')
+
+    @cached_property
+    def projection(self):
+        """
+        Projection of eye coordinates onto the screen, as a (4, 4) float64 array. It does not depend on subject_xyz,
+        and rotating the screen about the eye at the origin (see rotx, roty, rotz) only multiplies it on the right
+        by the transpose of the rotation, so it can be computed once per screen and reused (see view_matrix).
+        Computed on first access and kept, so the screen settings should not be changed afterwards.
+        """
         # format vectors as numpy arrays
         pa = np.array(self.pa, dtype=float)
         pb = np.array(self.pb, dtype=float)
         pc = np.array(self.pc, dtype=float)
         pe = np.array(self.pe, dtype=float)
-        subject_xyz = np.array(self.subject_xyz, dtype=float)
 
         # make aliases for "near" and "far" so that the code is easier to read
         n = self.near
@@ -66,12 +79,11 @@ class GenPerspective:
                       [vr[1], vu[1], vn[1], 0],
                       [vr[2], vu[2], vn[2], 0],
                       [    0,     0,     0, 1]], dtype=float)
-        T = np.array([[1, 0, 0, -subject_xyz[0]],
-                      [0, 1, 0, -subject_xyz[1]],
-                      [0, 0, 1, -subject_xyz[2]],
-                      [0, 0, 0,      1]], dtype=float)
 
-        return P.dot((M.T).dot(T)).astype('f4').tobytes(order='F')
+        return P.dot(M.T)
+
+    # rotx, roty and rotz rotate the screen corners and return a new GenPerspective. For a screen viewed from the
+    # origin, view_matrix gives the same matrix for all three rotations at once without rotating any points.
 
     def rotx(self, th):
         return GenPerspective(pa=rotx(self.pa, th), pb=rotx(self.pb, th), pc=rotx(self.pc, th),
@@ -84,3 +96,65 @@ class GenPerspective:
     def rotz(self, th):
         return GenPerspective(pa=rotz(self.pa, th), pb=rotz(self.pb, th), pc=rotz(self.pc, th),
                               pe=rotz(self.pe, th), near=self.near, far=self.far, subject_xyz=self.subject_xyz, horizontal_flip=self.horizontal_flip)
+
+
+def translation_matrix(subject_xyz):
+    return np.array([[1, 0, 0, -subject_xyz[0]],
+                     [0, 1, 0, -subject_xyz[1]],
+                     [0, 0, 1, -subject_xyz[2]],
+                     [0, 0, 0,      1]], dtype=float)
+
+def view_matrix(projection, subject_xyz, yaw, pitch, roll):
+    """
+    Equivalent to GenPerspective(...).rotz(yaw).rotx(pitch).roty(roll).matrix, for a GenPerspective whose
+    projection is given and whose eye point pe is at the origin.
+
+    Returned as a C-contiguous float32 array of the transpose, which has the same bytes as .matrix (column-major)
+    and can be written to a uniform directly, without going through a bytes object.
+
+    :param projection: GenPerspective.projection of the unrotated screen
+    :param subject_xyz: x, y, z position of subject, meters
+    :param yaw, pitch, roll: rotation of the screen about the z, x and y axes, radians
+    """
+    return apply_pose(projection, pose_matrix(subject_xyz[0], subject_xyz[1], subject_xyz[2], yaw, pitch, roll))
+
+def apply_pose(projection, pose, out=None):
+    """
+    view_matrix for a pose_matrix that has already been computed, e.g. once for all subscreens of a screen.
+
+    :param out: optional (4, 4) C-contiguous float64 array to hold the intermediate product, so that only
+                the returned float32 array is allocated
+    """
+    return np.ascontiguousarray(np.dot(projection, pose, out=out).T, dtype='f4')
+
+def pose_matrix(x, y, z, yaw, pitch, roll):
+    """
+    Return R.T . T as a (4, 4) float64 array, where R = roty(roll) . rotx(pitch) . rotz(yaw)
+    and T translates by -(x, y, z). Rotating the screen corners by R turns M into R M, so M.T picks up R.T on the right;
+    the view matrix is then GenPerspective.projection . pose_matrix(...).
+    It depends only on the subject pose, so it is shared by all subscreens.
+    """
+    cy, sy = np.cos(yaw), np.sin(yaw)
+    cp, sp = np.cos(pitch), np.sin(pitch)
+    cr, sr = np.cos(roll), np.sin(roll)
+
+    # R = roty(roll) . rotx(pitch) . rotz(yaw), written out
+    R = np.array([[cr*cy + sr*sp*sy, -cr*sy + sr*sp*cy, sr*cp],
+                  [           cp*sy,             cp*cy,   -sp],
+                  [-sr*cy + cr*sp*sy, sr*sy + cr*sp*cy, cr*cp]])
+
+    # B = R.T (as 4x4) . T
+    B = np.eye(4)
+    B[:3, :3] = R.T
+    B[:3, 3] = -(x*R[0] + y*R[1] + z*R[2])
+    return B
+
+# compile pose_matrix if numba is installed; it is called whenever the subject moves.
+# Its signature is given so that it is compiled (or loaded from the cache) on import rather than on the first frame.
+try:
+    from numba import njit
+except ImportError:
+    pass
+else:
+    pose_matrix = njit('float64[:, :](float64, float64, float64, float64, float64, float64)',
+                       cache=True, fastmath=True)(pose_matrix)
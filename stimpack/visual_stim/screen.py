@@ -1,5 +1,20 @@
 from math import sqrt
 
+import numpy as np
+
+def clamp01(v):
+    """Clamp v to [0, 1]."""
+    return 0.0 if v < 0.0 else (1.0 if v > 1.0 else v)
+
+def as_point(p):
+    """Tuple of Python floats with the coordinates of p, which may be any sequence or array."""
+    return tuple(float(v) for v in p)
+
+def distance(a, b):
+    """Euclidean distance between 3D points a and b."""
+    dx, dy, dz = a[0]-b[0], a[1]-b[1], a[2]-b[2]
+    return sqrt(dx*dx + dy*dy + dz*dz)
+
 class SubScreen:
     """
     SubScreen of a Screen object
@@ -16,6 +31,9 @@ class SubScreen:
 
     """
 
+    # fixed set of attributes, so that instances need no __dict__
+    __slots__ = ('pa', 'pb', 'pc', 'viewport_ll', 'viewport_width', 'viewport_height')
+
     def __init__(self, pa=(-0.15, 0.30, -0.15), pb=(+0.15, 0.30, -0.15), pc=(-0.15, 0.30, +0.15), viewport_ll=(-1,-1), viewport_width=2, viewport_height=2):
         """
         :param pa: meters (x,y,z)
@@ -26,11 +44,12 @@ class SubScreen:
         :param viewport_height: NDC height of viewport [0, 2]
 
         """
-        self.pa = pa
-        self.pb = pb
-        self.pc = pc
+        # stored as tuples of floats whether given as lists (e.g. from yaml), tuples or numpy arrays
+        self.pa = as_point(pa)
+        self.pb = as_point(pb)
+        self.pc = as_point(pc)
 
-        self.viewport_ll = viewport_ll
+        self.viewport_ll = as_point(viewport_ll)
         self.viewport_width = viewport_width
         self.viewport_height = viewport_height
 
@@ -63,9 +82,14 @@ class Screen:
     Parameters such as screen coordinates and the ID # are represented.
     """
 
+    # fixed set of attributes, so that instances need no __dict__
+    __slots__ = ('subscreens', 'x_display', 'display_index', 'fullscreen', 'vsync', 'square_size', 'square_loc',
+                 'square_on_color', 'square_off_color', 'name', 'horizontal_flip', 'pa', 'pb', 'pc', 'use_egl', 'samples',
+                 'width', 'height', 'subscreen_pa', 'subscreen_pb', 'subscreen_pc', 'subscreen_widths', 'subscreen_heights')
+
     def __init__(self, subscreens=None, x_display=None, display_index=0, fullscreen=None, vsync=None,
                  square_size=None, square_loc=None, square_on_color=None, square_off_color=None, name=None, horizontal_flip=False, 
-                 pa=(-0.15, 0.30, -0.15), pb=(+0.15, 0.30, -0.15), pc=(-0.15, 0.30, +0.15), use_egl=None):
+                 pa=(-0.15, 0.30, -0.15), pb=(+0.15, 0.30, -0.15), pc=(-0.15, 0.30, +0.15), use_egl=None, samples=None):
         """
         :param subscreens: list of SubScreen objects (see above), if none are provided, one full-viewport subscreen will be produced using inputs pa, pb, pc
         :param x_display: $DISPLAY environment variable relevant if using Xorg as display server. If None, the default display is used.
@@ -80,6 +104,8 @@ class Screen:
         :param horizontal_flip: Boolean. Flip horizontal axis of image, for rear-projection devices
         :param use_egl: Boolean. If True, use EGL for rendering. If False (Default), use GLX. 
                                  If the display server is Wayland (Linux), EGL will be used regardless.
+        :param samples: Number of samples per pixel for multisample anti-aliasing (default 4). 1 turns it off, which
+                        saves framebuffer bandwidth; higher values smooth edges more, up to what the GPU supports.
         """
         if subscreens is None:
             subscreens = [ SubScreen(pa=pa, pb=pb, pc=pc) ]
@@ -97,10 +123,12 @@ class Screen:
             square_on_color = 1.0
         if square_off_color is None:
             square_off_color = 1.0
-        square_on_color = max(min(square_on_color, 1.0), 0.0)
-        square_off_color = max(min(square_off_color, 1.0), 0.0)
+        square_on_color = clamp01(square_on_color)
+        square_off_color = clamp01(square_off_color)
         if use_egl is None:
             use_egl = False
+        if samples is None:
+            samples = 4
 
         if name is None:
             name = 'Screen ' + str(display_index)
@@ -117,18 +145,38 @@ class Screen:
         self.square_off_color = square_off_color
         self.name = name
         self.horizontal_flip = horizontal_flip
-        self.pa = pa
-        self.pb = pb
-        self.pc = pc
+        self.pa = as_point(pa)
+        self.pb = as_point(pb)
+        self.pc = as_point(pc)
         self.use_egl = use_egl
-        self.width = sqrt((pa[0]-pb[0])**2 + (pa[1]-pb[1])**2 + (pa[2]-pb[2])**2)
-        self.height = sqrt((pa[0]-pc[0])**2 + (pa[1]-pc[1])**2 + (pa[2]-pc[2])**2)
+        self.samples = samples
+        self.width = distance(self.pa, self.pb)
+        self.height = distance(self.pa, self.pc)
+
+        # corners of all subscreens as (n_subscreens, 3) arrays, and their physical sizes, in meters
+        self.subscreen_pa = np.array([sub.pa for sub in subscreens], dtype=float).reshape(-1, 3)
+        self.subscreen_pb = np.array([sub.pb for sub in subscreens], dtype=float).reshape(-1, 3)
+        self.subscreen_pc = np.array([sub.pc for sub in subscreens], dtype=float).reshape(-1, 3)
+        self.subscreen_widths = np.linalg.norm(self.subscreen_pb - self.subscreen_pa, axis=1)
+        self.subscreen_heights = np.linalg.norm(self.subscreen_pc - self.subscreen_pa, axis=1)
 
     def serialize(self):
         # get all variables needed to reconstruct the screen object
-        vars = ['x_display', 'display_index', 'fullscreen', 'vsync', 'square_size', 'square_loc', 
-                'square_on_color', 'square_off_color', 'name', 'horizontal_flip', 'pa', 'pb', 'pc', 'use_egl']
-        data = {var: getattr(self, var) for var in vars}
+        data = {'x_display': self.x_display,
+                'display_index': self.display_index,
+                'fullscreen': self.fullscreen,
+                'vsync': self.vsync,
+                'square_size': self.square_size,
+                'square_loc': self.square_loc,
+                'square_on_color': self.square_on_color,
+                'square_off_color': self.square_off_color,
+                'name': self.name,
+                'horizontal_flip': self.horizontal_flip,
+                'pa': self.pa,
+                'pb': self.pb,
+                'pc': self.pc,
+                'use_egl': self.use_egl,
+                'samples': self.samples}
 
         # special handling for tri_list since it could contain numpy values
         data['subscreens'] = [sub.serialize() for sub in self.subscreens]
@@ -137,13 +185,23 @@ class Screen:
 
     @classmethod
     def deserialize(cls, data):
-        # start building up the argument list to instantiate a screen
-        kwargs = data.copy()
-
-        # do some post-processing as necessary
-        kwargs['subscreens'] = [SubScreen.deserialize(sub) for sub in kwargs['subscreens']]
-
-        return Screen(**kwargs)
+        # settings missing from older serialized screens fall back to the defaults in __init__
+        return Screen(subscreens=[SubScreen.deserialize(sub) for sub in data['subscreens']],
+                      x_display=data.get('x_display'),
+                      display_index=data.get('display_index'),
+                      fullscreen=data.get('fullscreen'),
+                      vsync=data.get('vsync'),
+                      square_size=data.get('square_size'),
+                      square_loc=data.get('square_loc'),
+                      square_on_color=data.get('square_on_color'),
+                      square_off_color=data.get('square_off_color'),
+                      name=data.get('name'),
+                      horizontal_flip=data.get('horizontal_flip', False),
+                      pa=data.get('pa', (-0.15, 0.30, -0.15)),
+                      pb=data.get('pb', (+0.15, 0.30, -0.15)),
+                      pc=data.get('pc', (-0.15, 0.30, +0.15)),
+                      use_egl=data.get('use_egl'),
+                      samples=data.get('samples'))
 
 def main():
     screen = Screen(offset=(0.0, +0.3, 0.0), rotation=0)
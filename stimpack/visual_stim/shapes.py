@@ -1,32 +1,146 @@
 import numpy as np
-from numpy import matlib
+from functools import lru_cache
 from math import radians
 from . import util
 
+# Data type of the vertex, color and texture coordinate arrays built by the shapes below, as uploaded to the GPU.
+# Transformed copies (rotate, translate, ...) follow numpy's type promotion, so are float64 again.
+VERTEX_DTYPE = np.float32
+
+# Faces of GlCube and GlBox, in the order they are laid out
+CUBE_FACES = ('+x', '-x', '+y', '-y', '+z', '-z')
+
+# Corners (v1, v2, v3, v4) of each face of a cube with side length 1 centered on the origin
+UNIT_CUBE_CORNERS = 0.5 * np.array([[(+1, -1, -1), (+1, +1, -1), (+1, +1, +1), (+1, -1, +1)],
+                                    [(-1, -1, -1), (-1, +1, -1), (-1, +1, +1), (-1, -1, +1)],
+                                    [(+1, +1, -1), (-1, +1, -1), (-1, +1, +1), (+1, +1, +1)],
+                                    [(+1, -1, -1), (-1, -1, -1), (-1, -1, +1), (+1, -1, +1)],
+                                    [(+1, -1, +1), (+1, +1, +1), (-1, +1, +1), (-1, -1, +1)],
+                                    [(+1, -1, -1), (+1, +1, -1), (-1, +1, -1), (-1, -1, -1)]])
+
+# Vertices (3 x 36) of the unit cube as triangles (v1, v2, v3) and (v1, v3, v4) per face, as in GlQuad.
+# GlCube and GlBox scale and translate this rather than building the faces one by one.
+UNIT_CUBE_VERTICES = UNIT_CUBE_CORNERS[:, [0, 1, 2, 0, 2, 3], :].reshape(-1, 3).T.astype(VERTEX_DTYPE)
+UNIT_CUBE_VERTICES.flags.writeable = False
+
+def interleave(*columns):
+    """
+    Interleave arrays of shape (n_components, n) column by column, e.g. the corners of n triangles
+    into the (n_components, len(columns)*n) layout of GlVertices, triangle after triangle.
+    """
+    return np.stack(columns, axis=2).reshape(columns[0].shape[0], -1)
+
+def triangle_fan(rim, center, location):
+    """
+    Vertices of the triangles between consecutive points of rim (3 x n+1) and the point center, translated by location,
+    as a (3, 3n) array.
+    """
+    center = np.broadcast_to(np.asarray(center, dtype=float)[:, np.newaxis], (3, rim.shape[1]-1))
+    vertices = interleave(rim[:, :-1], rim[:, 1:], center)
+    return util.translate(vertices, location).astype(VERTEX_DTYPE)
+
+def concatenate_chunks(chunks):
+    """
+    Concatenate a list of (n_components, n) arrays along their columns, replacing the contents of the list with the
+    result so that it is only computed once. Returns the concatenated array, or None if the list is empty.
+    """
+    if not chunks:
+        return None
+    if len(chunks) > 1:
+        chunks[:] = [np.concatenate(chunks, axis=1)]
+    return chunks[0]
+
+def repeat_color(color, n):
+    """
+    Array with color in each of its n columns, as a read-only view of color rather than n copies of it.
+    """
+    return np.broadcast_to(np.asarray(color, dtype=VERTEX_DTYPE)[:, np.newaxis], (len(color), n))
+
 class GlVertices:
     def __init__(self, vertices=None, colors=None, tex_coords=None):
         self.vertices = vertices
         self.colors = colors
         self.tex_coords = tex_coords
+        self.dirty = False
+
+    # Objects passed to add() are collected as lists of arrays, which are concatenated once when the arrays are
+    # next read, rather than concatenating the growing arrays on every add().
+    @property
+    def vertices(self):
+        return concatenate_chunks(self.vertex_chunks)
+
+    @vertices.setter
+    def vertices(self, vertices):
+        self.vertex_chunks = [] if vertices is None else [vertices]
+
+    @property
+    def colors(self):
+        return concatenate_chunks(self.color_chunks)
+
+    @colors.setter
+    def colors(self, colors):
+        self.color_chunks = [] if colors is None else [colors]
+
+    @property
+    def tex_coords(self):
+        return concatenate_chunks(self.tex_coord_chunks)
+
+    @tex_coords.setter
+    def tex_coords(self, tex_coords):
+        self.tex_coord_chunks = [] if tex_coords is None else [tex_coords]
+
+    def __copy__(self):
+        # the copy shares arrays with this object, but not the lists that add() appends to
+        new = self.__class__.__new__(self.__class__)
+        new.__dict__.update(self.__dict__)
+        new.vertex_chunks = list(self.vertex_chunks)
+        new.color_chunks = list(self.color_chunks)
+        new.tex_coord_chunks = list(self.tex_coord_chunks)
+        return new
+
+    def mark_dirty(self):
+        """
+        Flag that the arrays of this object were modified in place, so that they are uploaded again when next painted.
+        """
+        self.dirty = True
 
     def add(self, obj):
-        # add vertices
-        if self.vertices is None:
-            self.vertices = obj.vertices
-        else:
-            self.vertices = np.concatenate((self.vertices, obj.vertices), axis=1)
+        self.vertex_chunks.extend(obj.vertex_chunks)
+        self.color_chunks.extend(obj.color_chunks)
+        self.tex_coord_chunks.extend(obj.tex_coord_chunks)
 
-        # add colors
-        if self.colors is None:
-            self.colors = obj.colors
-        else:
-            self.colors = np.concatenate((self.colors, obj.colors), axis=1)
+    def preallocate(self, n_vertices, use_texture=False):
+        """
+        Allocate the arrays for n_vertices vertices, to be filled in order with append_tri and append_quad.
+        """
+        self.vertices = np.empty((3, n_vertices), dtype=VERTEX_DTYPE)
+        self.colors = np.empty((4, n_vertices), dtype=VERTEX_DTYPE)
+        self.tex_coords = np.empty((2, n_vertices), dtype=VERTEX_DTYPE) if use_texture else None
+        self.n_appended = 0
 
-        # add tex_coords
-        if self.tex_coords is None:
-            self.tex_coords = obj.tex_coords
-        else:
-            self.tex_coords = np.concatenate((self.tex_coords, obj.tex_coords), axis=1)
+    def append_tri(self, v1, v2, v3, color, tc1=None, tc2=None, tc3=None):
+        """
+        Write a triangle into the arrays allocated by preallocate, after the vertices already appended.
+        """
+        i = self.n_appended
+        vertices = self.vertices
+        vertices[:, i] = v1
+        vertices[:, i+1] = v2
+        vertices[:, i+2] = v3
+        self.colors[:, i:i+3] = np.asarray(color, dtype=VERTEX_DTYPE)[:, np.newaxis]
+        if tc1 is not None:
+            tex_coords = self.tex_coords
+            tex_coords[:, i] = tc1
+            tex_coords[:, i+1] = tc2
+            tex_coords[:, i+2] = tc3
+        self.n_appended = i + 3
+
+    def append_quad(self, v1, v2, v3, v4, color, tc1=None, tc2=None, tc3=None, tc4=None):
+        """
+        Write a quad as the triangles (v1, v2, v3) and (v1, v3, v4), as GlQuad does, with append_tri.
+        """
+        self.append_tri(v1, v2, v3, color, tc1, tc2, tc3)
+        self.append_tri(v1, v3, v4, color, tc1, tc3, tc4)
 
     def rotate(self, z, x, y):
         """
@@ -52,11 +166,11 @@ class GlVertices:
         return GlVertices(vertices=util.translate(self.vertices, amt), colors=self.colors, tex_coords=self.tex_coords)
 
     def set_color(self, color):
-        new_colors = np.tile(np.array(color), (self.vertices.shape[1], 1)).T
+        new_colors = repeat_color(color, self.vertices.shape[1])
         return GlVertices(vertices=self.vertices, colors=new_colors, tex_coords=self.tex_coords)
 
     def shift_texture(self, shift):
-        new_tex_coords = self.tex_coords + np.tile(shift, (self.tex_coords.shape[1], 1)).T
+        new_tex_coords = self.tex_coords + np.asarray(shift, dtype=float)[:, np.newaxis]
         return GlVertices(vertices=self.vertices, colors=self.colors, tex_coords=new_tex_coords)
 
     @property
@@ -70,11 +184,11 @@ class GlVertices:
 
 class GlTri(GlVertices):
     def __init__(self, v1, v2, v3, color, tc1=None, tc2=None, tc3=None, texture=None):
-        vertices = np.concatenate((v1, v2, v3)).reshape((3, 3), order='F')
-        colors = np.concatenate((color, color, color)).reshape((4, 3), order='F')
+        vertices = np.array((v1, v2, v3), dtype=VERTEX_DTYPE).T
+        colors = np.array((color, color, color), dtype=VERTEX_DTYPE).T
 
         if tc1 is not None:
-            tex_coords = np.concatenate((tc1, tc2, tc3)).reshape((2, 3), order='F')
+            tex_coords = np.array((tc1, tc2, tc3), dtype=VERTEX_DTYPE).T
         else:
             tex_coords = None
         super().__init__(vertices=vertices, colors=colors, tex_coords=tex_coords)
@@ -83,18 +197,12 @@ class GlTri(GlVertices):
 class GlQuad(GlVertices):
     def __init__(self, v1, v2, v3, v4, color, tc1=(0, 0), tc2=(1, 0), tc3=(1, 1), tc4=(0, 1), texture_shift=(0, 0), use_texture=False):
         super().__init__()
+        self.preallocate(6, use_texture=use_texture)
         if use_texture:
-            self.add(GlTri(v1, v2, v3, color,
-                           [sum(x) for x in zip(tc1, texture_shift)],
-                           [sum(x) for x in zip(tc2, texture_shift)],
-                           [sum(x) for x in zip(tc3, texture_shift)]))
-            self.add(GlTri(v1, v3, v4, color,
-                           [sum(x) for x in zip(tc1, texture_shift)],
-                           [sum(x) for x in zip(tc3, texture_shift)],
-                           [sum(x) for x in zip(tc4, texture_shift)]))
+            tc1, tc2, tc3, tc4 = np.array((tc1, tc2, tc3, tc4), dtype=float) + np.asarray(texture_shift, dtype=float)
+            self.append_quad(v1, v2, v3, v4, color, tc1, tc2, tc3, tc4)
         else:
-            self.add(GlTri(v1, v2, v3, color))
-            self.add(GlTri(v1, v3, v4, color))
+            self.append_quad(v1, v2, v3, v4, color)
 
 class GlCircle(GlVertices):
     '''
@@ -107,15 +215,12 @@ class GlCircle(GlVertices):
         color = util.get_rgba(color)
 
         angles = np.linspace(0, 2*np.pi, n_steps+1)
-        for wedge in range(n_steps):
-            v1 = (radius*np.sin(angles[wedge]),
-                  0,
-                  radius*np.cos(angles[wedge]))
-            v2 = (radius*np.sin(angles[wedge+1]),
-                  0,
-                  radius*np.cos(angles[wedge+1]))
+        sin_a = np.sin(angles)
+        cos_a = np.cos(angles)
+        rim = np.array((radius*sin_a, np.zeros(n_steps+1), radius*cos_a))
 
-            self.add(GlTri(v1, v2, (0,0,0), color).translate(center))
+        self.vertices = triangle_fan(rim, (0, 0, 0), center)
+        self.colors = repeat_color(color, self.vertices.shape[1])
 
 class GlCube(GlVertices):
     def __init__(self, colors=None, center=[0, 0, 0], side_length=1.0):
@@ -138,16 +243,9 @@ class GlCube(GlVertices):
         if '-z' not in colors:
             colors['-z'] = (1, 0, 1, 1)
 
-        # shorten name for side length for readability
-        s = side_length/2
-
-        # add all of the faces
-        self.add(GlQuad((+s, -s, -s), (+s, +s, -s), (+s, +s, +s), (+s, -s, +s), colors['+x']).translate(center))
-        self.add(GlQuad((-s, -s, -s), (-s, +s, -s), (-s, +s, +s), (-s, -s, +s), colors['-x']).translate(center))
-        self.add(GlQuad((+s, +s, -s), (-s, +s, -s), (-s, +s, +s), (+s, +s, +s), colors['+y']).translate(center))
-        self.add(GlQuad((+s, -s, -s), (-s, -s, -s), (-s, -s, +s), (+s, -s, +s), colors['-y']).translate(center))
-        self.add(GlQuad((+s, -s, +s), (+s, +s, +s), (-s, +s, +s), (-s, -s, +s), colors['+z']).translate(center))
-        self.add(GlQuad((+s, -s, -s), (+s, +s, -s), (-s, +s, -s), (-s, -s, -s), colors['-z']).translate(center))
+        # scale and move the unit cube, and color each of its faces (6 vertices each)
+        self.vertices = UNIT_CUBE_VERTICES * side_length + np.asarray(center, dtype=VERTEX_DTYPE)[:, np.newaxis]
+        self.colors = np.repeat(np.array([colors[face] for face in CUBE_FACES], dtype=VERTEX_DTYPE).T, 6, axis=1)
 
 class GlBox(GlVertices):
     def __init__(self, colors=None, center=(0, 0, 0), side_lengths={'x':1.0, 'y':1.0, 'z':1.0}):
@@ -170,18 +268,50 @@ class GlBox(GlVertices):
         if '-z' not in colors:
             colors['-z'] = (1, 0, 1, 1)
 
-        # shorten name for side length for readability
-        x = side_lengths['x']/2
-        y = side_lengths['y']/2
-        z = side_lengths['z']/2
-
-        # add all of the faces
-        self.add(GlQuad((+x, -y, -z), (+x, +y, -z), (+x, +y, +z), (+x, -y, +z), colors['+x']).translate(center))
-        self.add(GlQuad((-x, -y, -z), (-x, +y, -z), (-x, +y, +z), (-x, -y, +z), colors['-x']).translate(center))
-        self.add(GlQuad((+x, +y, -z), (-x, +y, -z), (-x, +y, +z), (+x, +y, +z), colors['+y']).translate(center))
-        self.add(GlQuad((+x, -y, -z), (-x, -y, -z), (-x, -y, +z), (+x, -y, +z), colors['-y']).translate(center))
-        self.add(GlQuad((+x, -y, +z), (+x, +y, +z), (-x, +y, +z), (-x, -y, +z), colors['+z']).translate(center))
-        self.add(GlQuad((+x, -y, -z), (+x, +y, -z), (-x, +y, -z), (-x, -y, -z), colors['-z']).translate(center))
+        # scale and move the unit cube, and color each of its faces (6 vertices each)
+        scale = np.array([side_lengths['x'], side_lengths['y'], side_lengths['z']], dtype=VERTEX_DTYPE)[:, np.newaxis]
+        self.vertices = UNIT_CUBE_VERTICES * scale + np.asarray(center, dtype=VERTEX_DTYPE)[:, np.newaxis]
+        self.colors = np.repeat(np.array([colors[face] for face in CUBE_FACES], dtype=VERTEX_DTYPE).T, 6, axis=1)
+
+# Number of spherical rect geometries kept by spherical_rect_grid
+SPHERICAL_RECT_CACHE_SIZE = 16
+
+@lru_cache(maxsize=SPHERICAL_RECT_CACHE_SIZE)
+def spherical_rect_grid(width, height, sphere_radius, n_steps_x, n_steps_y):
+    """
+    Vertices (3 x n) and unshifted texture coordinates (2 x n) of the triangles of GlSphericalRect and
+    GlSphericalTexturedRect, for n_steps_x x n_steps_y patches. The arrays are cached and shared between shapes
+    with the same geometry, so they are read-only.
+    """
+    d_theta = (1/n_steps_x) * radians(width)
+    d_phi = (1/n_steps_y) * radians(height)
+
+    # lower-left corners of all patches, row by row
+    cc, rr = np.meshgrid(np.arange(n_steps_x), np.arange(n_steps_y))
+    cc = cc.ravel()
+    rr = rr.ravel()
+
+    # render patch at the equator (phi=pi/2) so it's not near the poles
+    # Also render it at theta = 90 degrees, for stimpack.visual_stim coordinates where heading (0,0,0) is +y axis
+    theta = np.pi/2 + radians(width) * (-1/2 + (cc/n_steps_x))
+    phi = np.pi/2 + radians(height) * (-1/2 + (rr/n_steps_y))
+    v1 = np.array(util.spherical_to_cartesian(sphere_radius, theta, phi), dtype=VERTEX_DTYPE)
+    v2 = np.array(util.spherical_to_cartesian(sphere_radius, theta, phi + d_phi), dtype=VERTEX_DTYPE)
+    v3 = np.array(util.spherical_to_cartesian(sphere_radius, theta + d_theta, phi), dtype=VERTEX_DTYPE)
+    v4 = np.array(util.spherical_to_cartesian(sphere_radius, theta + d_theta, phi + d_phi), dtype=VERTEX_DTYPE)
+
+    # texture coordinates of the patch corners
+    tc1 = np.array((cc/n_steps_x, rr/n_steps_y), dtype=VERTEX_DTYPE)
+    tc2 = np.array((cc/n_steps_x, (rr+1)/n_steps_y), dtype=VERTEX_DTYPE)
+    tc3 = np.array(((cc+1)/n_steps_x, rr/n_steps_y), dtype=VERTEX_DTYPE)
+    tc4 = np.array(((cc+1)/n_steps_x, (rr+1)/n_steps_y), dtype=VERTEX_DTYPE)
+
+    # two triangles per patch: (v1, v2, v4) and (v1, v3, v4)
+    vertices = interleave(v1, v2, v4, v1, v3, v4)
+    tex_coords = interleave(tc1, tc2, tc4, tc1, tc3, tc4)
+    vertices.flags.writeable = False
+    tex_coords.flags.writeable = False
+    return vertices, tex_coords
 
 class GlSphericalRect(GlVertices):
     def __init__(self,
@@ -194,20 +324,8 @@ class GlSphericalRect(GlVertices):
         super().__init__()
         color = util.get_rgba(color)
 
-        d_theta = (1/n_steps_x) * radians(width)
-        d_phi = (1/n_steps_y) * radians(height)
-        for rr in range(n_steps_y):
-            for cc in range(n_steps_x):
-                # render patch at the equator (phi=pi/2) so it's not near the poles
-                # Also render it at theta = 90 degrees, for stimpack.visual_stim coordinates where heading (0,0,0) is +y axis
-                theta = np.pi/2 + radians(width) * (-1/2 + (cc/n_steps_x))
-                phi = np.pi/2 + radians(height) * (-1/2 + (rr/n_steps_y))
-                v1 = util.spherical_to_cartesian(sphere_radius, theta, phi)
-                v2 = util.spherical_to_cartesian(sphere_radius, theta, phi + d_phi)
-                v3 = util.spherical_to_cartesian(sphere_radius, theta + d_theta, phi)
-                v4 = util.spherical_to_cartesian(sphere_radius, theta + d_theta, phi + d_phi)
-                self.add(GlTri(v1, v2, v4, color))
-                self.add(GlTri(v1, v3, v4, color))
+        self.vertices, _ = spherical_rect_grid(width, height, sphere_radius, n_steps_x, n_steps_y)
+        self.colors = repeat_color(color, self.vertices.shape[1])
 
 class GlSphericalTexturedRect(GlVertices):
     def __init__(self,
@@ -222,33 +340,12 @@ class GlSphericalTexturedRect(GlVertices):
         super().__init__()
         color = util.get_rgba(color)
 
-        d_theta = (1/n_steps_x) * radians(width)
-        d_phi = (1/n_steps_y) * radians(height)
-        for rr in range(n_steps_y):
-            for cc in range(n_steps_x):
-                # render patch at the equator (phi=pi/2) so it's not near the poles
-                # Also render it at theta = 90 degrees, for stimpack.visual_stim coordinates where heading (0,0,0) is +y axis
-                theta = np.pi/2 + radians(width) * (-1/2 + (cc/n_steps_x))
-                phi = np.pi/2 + radians(height) * (-1/2 + (rr/n_steps_y))
-                v1 = util.spherical_to_cartesian(sphere_radius, theta, phi)
-                v2 = util.spherical_to_cartesian(sphere_radius, theta, phi + d_phi)
-                v3 = util.spherical_to_cartesian(sphere_radius, theta + d_theta, phi)
-                v4 = util.spherical_to_cartesian(sphere_radius, theta + d_theta, phi + d_phi)
-                if texture:
-                    tc1 = (cc/n_steps_x, rr/n_steps_y)
-                    tc2 = (cc/n_steps_x, (rr+1)/n_steps_y)
-                    tc3 = ((cc+1)/n_steps_x, rr/n_steps_y)
-                    tc4 = ((cc+1)/n_steps_x, (rr+1)/n_steps_y)
-                    self.add(GlTri(v1, v2, v4, color, [sum(x) for x in zip(tc1, texture_shift)],
-                                                      [sum(x) for x in zip(tc2, texture_shift)],
-                                                      [sum(x) for x in zip(tc4, texture_shift)]))
-
-                    self.add(GlTri(v1, v3, v4, color, [sum(x) for x in zip(tc1, texture_shift)],
-                                                      [sum(x) for x in zip(tc3, texture_shift)],
-                                                      [sum(x) for x in zip(tc4, texture_shift)]))
-                else:
-                    self.add(GlTri(v1, v2, v4, color))
-                    self.add(GlTri(v1, v3, v4, color))
+        # the geometry is only computed once for repeated calls with the same parameters, e.g. for a moving texture
+        self.vertices, tex_coords = spherical_rect_grid(width, height, sphere_radius, n_steps_x, n_steps_y)
+        self.colors = repeat_color(color, self.vertices.shape[1])
+
+        if texture:
+            self.tex_coords = tex_coords + np.asarray(texture_shift, dtype=VERTEX_DTYPE)[:, np.newaxis]
 
 class GlSphericalEllipse(GlVertices):
     def __init__(self,
@@ -264,17 +361,17 @@ class GlSphericalEllipse(GlVertices):
         v_center = util.spherical_to_cartesian(sphere_radius, np.pi/2, np.pi/2)
 
         angles = np.linspace(0, 2*np.pi, n_steps+1)
-        for wedge in range(n_steps):
-            # render circle at the equator (phi=pi/2) so it's not near the poles
-            # Also render it at theta = 90 degrees, for stimpack.visual_stim coordinates where heading (0,0,0) is +y axis
-            v1 = util.spherical_to_cartesian(sphere_radius,
-                                        np.pi/2 + radians(width/2)*np.cos(angles[wedge]),
-                                        np.pi/2 + radians(height/2)*np.sin(angles[wedge]))
-            v2 = util.spherical_to_cartesian(sphere_radius,
-                                        np.pi/2 + radians(width/2)*np.cos(angles[wedge+1]),
-                                        np.pi/2 + radians(height/2)*np.sin(angles[wedge+1]))
-
-            self.add(GlTri(v1, v2, v_center, color).translate(sphere_location))
+        sin_a = np.sin(angles)
+        cos_a = np.cos(angles)
+
+        # render circle at the equator (phi=pi/2) so it's not near the poles
+        # Also render it at theta = 90 degrees, for stimpack.visual_stim coordinates where heading (0,0,0) is +y axis
+        rim = np.array(util.spherical_to_cartesian(sphere_radius,
+                                                   np.pi/2 + radians(width/2)*cos_a,
+                                                   np.pi/2 + radians(height/2)*sin_a))
+
+        self.vertices = triangle_fan(rim, v_center, sphere_location)
+        self.colors = repeat_color(color, self.vertices.shape[1])
 
 class GlCylindricalWithPhiEllipse(GlVertices):
     def __init__(self,
@@ -290,17 +387,17 @@ class GlCylindricalWithPhiEllipse(GlVertices):
         v_center = util.cylindrical_w_phi_to_cartesian(cylinder_radius, np.pi/2, np.pi/2)
 
         angles = np.linspace(0, 2*np.pi, n_steps+1)
-        for wedge in range(n_steps):
-            # render circle at the equator (phi=pi/2) so it's not near the poles
-            # Also render it at theta = 90 degrees, for stimpack.visual_stim coordinates where heading (0,0,0) is +y axis
-            v1 = util.cylindrical_w_phi_to_cartesian(cylinder_radius,
-                                            np.pi/2 + radians(width/2)*np.cos(angles[wedge]),
-                                            np.pi/2 + radians(height/2)*np.sin(angles[wedge]))
-            v2 = util.cylindrical_w_phi_to_cartesian(cylinder_radius,
-                                            np.pi/2 + radians(width/2)*np.cos(angles[wedge+1]),
-                                            np.pi/2 + radians(height/2)*np.sin(angles[wedge+1]))
-
-            self.add(GlTri(v1, v2, v_center, color).translate(cylinder_location))
+        sin_a = np.sin(angles)
+        cos_a = np.cos(angles)
+
+        # render circle at the equator (phi=pi/2) so it's not near the poles
+        # Also render it at theta = 90 degrees, for stimpack.visual_stim coordinates where heading (0,0,0) is +y axis
+        rim = np.array(util.cylindrical_w_phi_to_cartesian(cylinder_radius,
+                                                           np.pi/2 + radians(width/2)*cos_a,
+                                                           np.pi/2 + radians(height/2)*sin_a))
+
+        self.vertices = triangle_fan(rim, v_center, cylinder_location)
+        self.colors = repeat_color(color, self.vertices.shape[1])
 
 class GlSphericalCirc(GlVertices):
     def __init__(self,
@@ -315,17 +412,17 @@ class GlSphericalCirc(GlVertices):
         v_center = util.spherical_to_cartesian(sphere_radius, np.pi/2, np.pi/2)
 
         angles = np.linspace(0, 2*np.pi, n_steps+1)
-        for wedge in range(n_steps):
-            # render circle at the equator (phi=pi/2) so it's not near the poles
-            # Also render it at theta = 90 degrees, for stimpack.visual_stim coordinates where heading (0,0,0) is +y axis
-            v1 = util.spherical_to_cartesian(sphere_radius,
-                                        np.pi/2 + radians(circle_radius)*np.cos(angles[wedge]),
-                                        np.pi/2 + radians(circle_radius)*np.sin(angles[wedge]))
-            v2 = util.spherical_to_cartesian(sphere_radius,
-                                        np.pi/2 + radians(circle_radius)*np.cos(angles[wedge+1]),
-                                        np.pi/2 + radians(circle_radius)*np.sin(angles[wedge+1]))
-
-            self.add(GlTri(v1, v2, v_center, color).translate(sphere_location))
+        sin_a = np.sin(angles)
+        cos_a = np.cos(angles)
+
+        # render circle at the equator (phi=pi/2) so it's not near the poles
+        # Also render it at theta = 90 degrees, for stimpack.visual_stim coordinates where heading (0,0,0) is +y axis
+        rim = np.array(util.spherical_to_cartesian(sphere_radius,
+                                                   np.pi/2 + radians(circle_radius)*cos_a,
+                                                   np.pi/2 + radians(circle_radius)*sin_a))
+
+        self.vertices = triangle_fan(rim, v_center, sphere_location)
+        self.colors = repeat_color(color, self.vertices.shape[1])
 
 class GlCylindricalPoints(GlVertices):
     def __init__(self,
@@ -337,12 +434,11 @@ class GlCylindricalPoints(GlVertices):
 
         color = util.get_rgba(color)
 
-        cartesian_coords = []
-        for pt in range(len(theta)):
-            cartesian_coords.append(util.cylindrical_w_phi_to_cartesian(cylinder_radius, radians(theta[pt]), radians(phi[pt])))
-
-        vertices = np.vstack(cartesian_coords).T  # 3 x n_points
-        colors = matlib.repmat(color, len(theta), 1).T  # 4 x n_points
+        # convert all points at once
+        theta = np.radians(np.asarray(theta, dtype=float))
+        phi = np.radians(np.asarray(phi, dtype=float))
+        vertices = util.cylindrical_w_phi_to_cartesian_points(float(cylinder_radius), theta, phi).astype(VERTEX_DTYPE)  # 3 x n_points
+        colors = repeat_color(color, len(theta))  # 4 x n_points
 
         super().__init__(vertices=vertices, colors=colors)
 
@@ -355,12 +451,11 @@ class GlSphericalPoints(GlVertices):
 
         color = util.get_rgba(color)
 
-        cartesian_coords = []
-        for pt in range(len(theta)):
-            cartesian_coords.append(util.spherical_to_cartesian(sphere_radius, np.pi/2 + radians(theta[pt]), np.pi/2 + radians(phi[pt])))
-
-        vertices = np.vstack(cartesian_coords).T  # 3 x n_points
-        colors = matlib.repmat(color, len(theta), 1).T  # 4 x n_points
+        # convert all points at once
+        theta = np.pi/2 + np.radians(np.asarray(theta, dtype=float))
+        phi = np.pi/2 + np.radians(np.asarray(phi, dtype=float))
+        vertices = util.spherical_to_cartesian_points(float(sphere_radius), theta, phi).astype(VERTEX_DTYPE)  # 3 x n_points
+        colors = repeat_color(color, len(theta))  # 4 x n_points
 
         super().__init__(vertices=vertices, colors=colors)
 
@@ -370,8 +465,8 @@ class GlPointCollection(GlVertices):
                  color=[1, 1, 1, 1]):
         color = util.get_rgba(color)
 
-        vertices = np.vstack(locations)  # 3 x n_points
-        colors = matlib.repmat(color, vertices.shape[1], 1).T  # 4 x n_points
+        vertices = np.vstack(locations).astype(VERTEX_DTYPE)  # 3 x n_points
+        colors = repeat_color(color, vertices.shape[1])  # 4 x n_points
 
         super().__init__(vertices=vertices, colors=colors)
 
@@ -397,24 +492,36 @@ class GlCylinder(GlVertices):
 
         d_theta = np.radians(cylinder_angular_extent) / n_faces
         theta_start = -np.radians(cylinder_angular_extent)/2
-        for face in range(n_faces):
-            v1 = util.cylindrical_to_cartesian(cylinder_radius, theta_start+face*d_theta, cylinder_height/2)
-            v2 = util.cylindrical_to_cartesian(cylinder_radius, theta_start+face*d_theta, -cylinder_height/2)
-            v3 = util.cylindrical_to_cartesian(cylinder_radius, theta_start+(face+1)*d_theta, -cylinder_height/2)
-            v4 = util.cylindrical_to_cartesian(cylinder_radius, theta_start+(face+1)*d_theta, cylinder_height/2)
-
-            new_color = [color[0], color[1], color[2], alpha_by_face[face]]
-
-            if texture:
-                self.add(GlQuad(v1, v2, v3, v4, new_color,
-                                tc1=(face/n_faces*n_texture_repeat_x, n_texture_repeat_y),
-                                tc2=(face/n_faces*n_texture_repeat_x, 0),
-                                tc3=((face+1)/n_faces*n_texture_repeat_x, 0),
-                                tc4=((face+1)/n_faces*n_texture_repeat_x, n_texture_repeat_y),
-                                texture_shift=texture_shift,
-                                use_texture=True).translate(cylinder_location))
-            else:
-                self.add(GlQuad(v1, v2, v3, v4, color).translate(cylinder_location))
+
+        # edges between the faces, along the top and bottom of the cylinder
+        edge = np.arange(n_faces+1)
+        x, y, _ = util.cylindrical_to_cartesian(cylinder_radius, theta_start+edge*d_theta, 0)
+        top = np.array((x, y, np.full(n_faces+1, cylinder_height/2)))
+        bottom = np.array((x, y, np.full(n_faces+1, -cylinder_height/2)))
+
+        # each face is the quad (v1, v2, v3, v4) = (top left, bottom left, bottom right, top right), drawn as in GlQuad
+        v1, v2, v3, v4 = top[:, :-1], bottom[:, :-1], bottom[:, 1:], top[:, 1:]
+        self.vertices = util.translate(interleave(v1, v2, v3, v1, v3, v4), cylinder_location).astype(VERTEX_DTYPE)
+
+        if texture:
+            # color with the alpha of each face, for all 6 vertices of the face
+            face_colors = np.empty((4, n_faces), dtype=VERTEX_DTYPE)
+            face_colors[:3] = np.asarray(color[:3], dtype=VERTEX_DTYPE)[:, np.newaxis]
+            face_colors[3] = alpha_by_face
+            self.colors = np.repeat(face_colors, 6, axis=1)
+
+            tc_left = edge[:-1]/n_faces*n_texture_repeat_x
+            tc_right = edge[1:]/n_faces*n_texture_repeat_x
+            tc_top = np.full(n_faces, n_texture_repeat_y)
+            tc_bottom = np.zeros(n_faces)
+            tc1 = np.array((tc_left, tc_top))
+            tc2 = np.array((tc_left, tc_bottom))
+            tc3 = np.array((tc_right, tc_bottom))
+            tc4 = np.array((tc_right, tc_top))
+            tex_coords = interleave(tc1, tc2, tc3, tc1, tc3, tc4) + np.asarray(texture_shift, dtype=float)[:, np.newaxis]
+            self.tex_coords = tex_coords.astype(VERTEX_DTYPE)
+        else:
+            self.colors = repeat_color(color, self.vertices.shape[1])
 
 class GlCylindricalWithPhiRect(GlVertices):
     def __init__(self,
@@ -429,15 +536,21 @@ class GlCylindricalWithPhiRect(GlVertices):
 
         d_theta = (1/n_steps_x) * radians(width)
         d_phi = (1/n_steps_y) * radians(height)
-        for rr in range(n_steps_y):
-            for cc in range(n_steps_x):
-                # render patch at the equator (phi=pi/2) so it's not near the poles
-                # Also render it at theta = 90 degrees, for stimpack.visual_stim coordinates where heading (0,0,0) is +y axis
-                theta = np.pi/2 + radians(width) * (-1/2 + (cc/n_steps_x))
-                phi = np.pi/2 + radians(height) * (-1/2 + (rr/n_steps_y))
-                v1 = util.cylindrical_w_phi_to_cartesian(cylinder_radius, theta, phi)
-                v2 = util.cylindrical_w_phi_to_cartesian(cylinder_radius, theta, phi + d_phi)
-                v3 = util.cylindrical_w_phi_to_cartesian(cylinder_radius, theta + d_theta, phi)
-                v4 = util.cylindrical_w_phi_to_cartesian(cylinder_radius, theta + d_theta, phi + d_phi)
-                self.add(GlTri(v1, v2, v4, color))
-                self.add(GlTri(v1, v3, v4, color))
+
+        # lower-left corners of all patches, row by row
+        cc, rr = np.meshgrid(np.arange(n_steps_x), np.arange(n_steps_y))
+        cc = cc.ravel()
+        rr = rr.ravel()
+
+        # render patch at the equator (phi=pi/2) so it's not near the poles
+        # Also render it at theta = 90 degrees, for stimpack.visual_stim coordinates where heading (0,0,0) is +y axis
+        theta = np.pi/2 + radians(width) * (-1/2 + (cc/n_steps_x))
+        phi = np.pi/2 + radians(height) * (-1/2 + (rr/n_steps_y))
+        v1 = np.array(util.cylindrical_w_phi_to_cartesian(cylinder_radius, theta, phi), dtype=VERTEX_DTYPE)
+        v2 = np.array(util.cylindrical_w_phi_to_cartesian(cylinder_radius, theta, phi + d_phi), dtype=VERTEX_DTYPE)
+        v3 = np.array(util.cylindrical_w_phi_to_cartesian(cylinder_radius, theta + d_theta, phi), dtype=VERTEX_DTYPE)
+        v4 = np.array(util.cylindrical_w_phi_to_cartesian(cylinder_radius, theta + d_theta, phi + d_phi), dtype=VERTEX_DTYPE)
+
+        # two triangles per patch: (v1, v2, v4) and (v1, v3, v4)
+        self.vertices = interleave(v1, v2, v4, v1, v3, v4)
+        self.colors = repeat_color(color, self.vertices.shape[1])
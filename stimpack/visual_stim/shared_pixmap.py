@@ -41,7 +41,7 @@ class SharedPixMapStimulus:
         
     def load_stream(self):
 
-        self.s = sched.scheduler(time.time, time.sleep)
+        self.s = sched.scheduler(time.monotonic, time.sleep)
         
         tis = np.arange(0,self.dur,1/self.nominal_frame_rate)
         tis = tis[1:]
@@ -51,7 +51,7 @@ class SharedPixMapStimulus:
         self.thread = threading.Thread(target=self.s.run)
 
     def start_stream(self):
-        self.t = time.time()
+        self.t = time.monotonic()
         self.thread.start()
 
 class WhiteNoise(SharedPixMapStimulus):
@@ -70,17 +70,18 @@ class WhiteNoise(SharedPixMapStimulus):
     
     def genframe(self):
 
-        t = time.time()-self.t
+        t = time.monotonic()-self.t
         seed = int(round(self.seed + t*self.nominal_frame_rate)) # slightly risky, as t could be imprecise with PixMap approach
-        np.random.seed(seed)
-        img = np.random.rand(self.frame_shape[0], self.frame_shape[1])
+        # A RandomState of its own draws the same values as seeding the global generator would, so frames can still
+        # be regenerated from the seed, without touching the global state from the streaming thread.
+        img = np.random.RandomState(seed).random_sample((self.frame_shape[0], self.frame_shape[1]))
 
-        img_int = img*255/2+10
-        img_int = img_int.astype(np.uint8)
+        img *= 255/2
+        img += 10
+        img_int = img.astype(np.uint8)
             
         if self.coverage=='left':
             img_int[:,:int(img_int.shape[1]/2)] = 0
-        self.global_frame[:,:,0] = img_int
-        self.global_frame[:,:,1] = img_int
-        self.global_frame[:,:,2] = img_int
+        # same image in each color channel
+        self.global_frame[:] = img_int[:, :, np.newaxis]
 
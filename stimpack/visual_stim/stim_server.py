@@ -1,5 +1,5 @@
 import platform, os
-from time import time
+from time import monotonic
 
 import stimpack.visual_stim.framework
 from stimpack.visual_stim.screen import Screen
@@ -82,13 +82,18 @@ class VisualStimServer(MySocketServer):
         self.corner_square_off()
         self.set_idle_background(0)
 
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # names of class attributes / methods, so that __getattr__ need not call dir() on every miss
+        cls._attr_names = frozenset(dir(cls))
+
     def __getattr__(self, name):
         '''
         Allow the server to execute function calls as client, assuming server isn't busy looping. 
         If loop is on a separate thread, it can execute calls.
         '''
-        if name in dir(self):
-            return self.name
+        if name in type(self)._attr_names:
+            return object.__getattribute__(self, name)
         
         # If not a method of the server class, handle it as a request.
         def f(*args, **kwargs):
@@ -132,7 +137,7 @@ class VisualStimServer(MySocketServer):
             if isinstance(request, dict) and ('name' in request) and (request['name'] in self.time_stamp_commands):
                 if 'kwargs' not in request:
                     request['kwargs'] = {}
-                request['kwargs']['t'] = time()
+                request['kwargs']['t'] = monotonic() # screens compare it to time.monotonic() when painting
 
         # send modified request list to clients
         for screen_client in self.screen_clients:
@@ -164,6 +169,9 @@ class VisualStimServer(MySocketServer):
         if self.spms is not None:
             self.spms.close()
     ### Shared memory pixmap stim functions ###
+
+# __init_subclass__ only runs for subclasses, so set the attribute names for VisualStimServer itself here.
+VisualStimServer._attr_names = frozenset(dir(VisualStimServer))
         
 def launch_stim_server(screen_or_screens=None, **kwargs):
     # set defaults
@@ -3,7 +3,6 @@ Class + functions for making parameter trajectories for stimpack.visual_stim sti
 
 Generally access this class using make_as_trajectory and return_for_time_t
 """
-from scipy.interpolate import interp1d
 import numpy as np
 from stimpack.util import make_as
 
@@ -18,6 +17,58 @@ def return_for_time_t(parameter, t):
     else: # not specified as a trajectory dict., just return the original param value
         return parameter
 
+def make_batch_getter(parameters):
+    """
+    Return a function of t that returns the values of parameters at time t, as a list, like return_for_time_t.
+
+    Scalar-valued TVPairs trajectories that share time points and interpolation settings are stacked
+    into a single interpolator, so that they are looked up together with one call per time t.
+    """
+    from scipy.interpolate import interp1d # imported on first use; slow to import
+
+    parameters = list(parameters)
+
+    # group batchable trajectories by (times, kind, fill_value)
+    groups = {}
+    for i, parameter in enumerate(parameters):
+        if isinstance(parameter, TVPairs) and parameter.is_batchable():
+            key = (parameter.times, parameter.kind, parameter.fill_value)
+            groups.setdefault(key, []).append(i)
+
+    batches = []
+    batched = set()
+    for (times, kind, fill_value), indices in groups.items():
+        if len(indices) < 2:
+            continue
+        values = np.stack([np.asarray(parameters[i].values, dtype=float) for i in indices], axis=-1)
+        batches.append((indices, interp1d(times, values, kind=kind, fill_value=fill_value, axis=0)))
+        batched.update(indices)
+    unbatched = [(i, parameter) for i, parameter in enumerate(parameters) if i not in batched]
+
+    def get_values(t):
+        result = [None] * len(parameters)
+        for indices, interpolator in batches:
+            for i, value in zip(indices, interpolator(t)):
+                result[i] = value
+        for i, parameter in unbatched:
+            result[i] = return_for_time_t(parameter, t)
+        return result
+
+    return get_values
+
+def sample_trajectory(parameter, times):
+    """
+    Return the values of parameter at each of times, as an array with one entry per time, like return_for_time_t.
+    TVPairs trajectories are interpolated at all times in one call.
+    """
+    times = np.asarray(times, dtype=float)
+    if isinstance(parameter, TVPairs):
+        return np.asarray(parameter.getValue(times))
+    elif isinstance(parameter, Trajectory):
+        return np.array([parameter.getValue(t) for t in times])
+    else: # not specified as a trajectory dict., the original param value at every time
+        return np.array([parameter] * len(times))
+
 class Trajectory:
     """Trajectory class."""
 
@@ -35,9 +86,19 @@ class TVPairs(Trajectory):
     :kind: interpolation type. See scipy.interpolate.interp1d for options.
     """
     def __init__(self, tv_pairs, kind='linear', fill_value='extrapolate'):
+        from scipy.interpolate import interp1d # imported on first use; slow to import
+
         times, values = zip(*tv_pairs)
+        self.times = times
+        self.values = values
+        self.kind = kind
+        self.fill_value = fill_value
         self.getValue = interp1d(times, values, kind=kind, fill_value=fill_value, axis=0)
 
+    def is_batchable(self):
+        """Whether this trajectory can be stacked with others in make_batch_getter: scalar values and a hashable fill_value."""
+        return all(np.ndim(v) == 0 for v in self.values) and isinstance(self.fill_value, (str, int, float))
+
 class Sinusoid(Trajectory):
     """
     Temporal sinusoid trajectory.
@@ -48,19 +48,6 @@ def generate_lowercase_barcode(length=5, existing_barcodes=[]):
 def normalize(vec):
     return vec / np.linalg.norm(vec)
 
-def qimage2ndarray(qimage):
-    '''  Converts a QImage into an opencv MAT format  '''
-
-    qimage = qimage.convertToFormat(4)
-
-    width = qimage.width()
-    height = qimage.height()
-
-    ptr = qimage.bits()
-    ptr.setsize(qimage.byteCount())
-    arr = np.array(ptr).reshape(height, width, 4)  #  Copies the data
-    return arr
-
 # rotation matrix reference:
 # https://en.wikipedia.org/wiki/Rotation_matrix
 
@@ -147,6 +134,39 @@ def cartesian_to_cylindrical_w_phi(x, y, z):
     phi = np.arctan2(z, r)
     return r, theta, phi
 
+def spherical_to_cartesian_points(r, theta, phi):
+    """
+    spherical_to_cartesian for 1D float64 arrays of angles, returning the points as a (3, n) float64 array
+    """
+    points = np.empty((3, theta.shape[0]))
+    sin_phi = np.sin(phi)
+    points[0] = r * sin_phi * np.cos(theta)
+    points[1] = r * sin_phi * np.sin(theta)
+    points[2] = r * np.cos(phi)
+    return points
+
+def cylindrical_w_phi_to_cartesian_points(r, theta, phi):
+    """
+    cylindrical_w_phi_to_cartesian for 1D float64 arrays of angles, returning the points as a (3, n) float64 array
+    """
+    points = np.empty((3, theta.shape[0]))
+    points[0] = r * np.cos(theta)
+    points[1] = r * np.sin(theta)
+    points[2] = r / np.tan(phi)
+    return points
+
+# compile the point conversions if numba is installed; they are used to build point cloud stims.
+# Their signatures are given so that they are compiled (or loaded from the cache) on import rather than on first use.
+try:
+    from numba import njit
+except ImportError:
+    pass
+else:
+    spherical_to_cartesian_points = njit('float64[:, :](float64, float64[:], float64[:])',
+                                         cache=True, fastmath=True)(spherical_to_cartesian_points)
+    cylindrical_w_phi_to_cartesian_points = njit('float64[:, :](float64, float64[:], float64[:])',
+                                                 cache=True, fastmath=True)(cylindrical_w_phi_to_cartesian_points)
+
 def translate(pts, amt):
     # convert point(s) and translate amount to numpy arrays
     pts = np.array(pts, dtype=float)
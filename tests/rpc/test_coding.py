@@ -0,0 +1,107 @@
+import numpy as np
+import pytest
+
+from stimpack.rpc import util
+from stimpack.rpc.util import JSONCoderWithTuple, RequestEncoder, hint_tuples, unhint_tuples
+
+ITEMS = [
+    (1, 2.5, 'a'),
+    [(1, 2), [3, (4, 5)]],
+    {'pos': (0.1, 0.2, 0.3), 'nested': {'t': [(1,), ()]}, 'l': [1, 2]},
+    {'target': 'visual', 'name': 'load_stim', 'args': ('ConstantBackground',), 'kwargs': {'color': (0.5, 0.5, 0.5, 1)}},
+]
+
+
+@pytest.fixture(params=['orjson', 'json'])
+def coder(request, monkeypatch):
+    # run each test with orjson, if it is installed, and with the json module fallback
+    if request.param == 'orjson':
+        if util.orjson is None:
+            pytest.skip('orjson is not installed')
+    else:
+        monkeypatch.setattr(util, 'orjson', None)
+    return JSONCoderWithTuple
+
+
+@pytest.mark.parametrize('item', ITEMS)
+def test_unhint_tuples(item):
+    assert unhint_tuples(hint_tuples(item)) == item
+
+
+@pytest.mark.parametrize('item', ITEMS)
+def test_round_trip(coder, item):
+    assert coder.decode(coder.encode_to_bytes(item)) == item
+    assert coder.decode(coder.encode(item)) == item
+
+
+@pytest.mark.parametrize('item', ITEMS)
+def test_matches_baseline_decoding(coder, item):
+    # JSON written by the original encoder, which only used the json module, still decodes the same
+    import json
+    assert coder.decode(json.JSONEncoder().encode(hint_tuples(item))) == item
+
+
+def test_numpy_and_non_finite(coder):
+    item = {'array': np.array([[1.0, np.nan], [np.inf, 2.0]]),
+            'scalar': np.float32(0.5),
+            'int': np.int64(3),
+            'floats': [float('nan'), -float('inf'), 1.5]}
+    expected = {'array': [[1.0, None], [None, 2.0]],
+                'scalar': 0.5,
+                'int': 3,
+                'floats': [None, None, 1.5]}
+    assert coder.decode(coder.encode_to_bytes(item)) == expected
+    assert coder.decode(coder.encode(item)) == expected
+
+
+def test_numpy_layouts_and_dtypes(coder):
+    # arrays that orjson does not serialize natively are converted as by the json module
+    array = np.arange(6, dtype=float).reshape(2, 3)
+    item = {'transposed': array.T,
+            'strided': np.arange(6)[::2],
+            'strings': np.array(['a', 'bc']),
+            'objects': np.array([1, 'a', None], dtype=object),
+            'datetimes': np.array(['2021-01-02', '2021-01-02T03:04:05.5'], dtype='datetime64[ms]'),
+            'datetime': np.datetime64('2021-01-02'),
+            'big_int': 2**70}
+    expected = {'transposed': [[0.0, 3.0], [1.0, 4.0], [2.0, 5.0]],
+                'strided': [0, 2, 4],
+                'strings': ['a', 'bc'],
+                'objects': [1, 'a', None],
+                'datetimes': ['2021-01-02T00:00:00', '2021-01-02T03:04:05.500000'],
+                'datetime': '2021-01-02T00:00:00',
+                'big_int': 2**70}
+    assert coder.decode(coder.encode_to_bytes(item)) == expected
+    assert coder.decode(coder.encode(item)) == expected
+
+
+def test_same_output_with_and_without_orjson(monkeypatch):
+    if util.orjson is None:
+        pytest.skip('orjson is not installed')
+    item = [(np.arange(6).reshape(2, 3).T, np.array(['a', 'bc'])), {'x': np.float32(np.nan), 'n': 2**70}]
+    with_orjson = JSONCoderWithTuple.decode(JSONCoderWithTuple.encode_to_bytes(item))
+    monkeypatch.setattr(util, 'orjson', None)
+    assert JSONCoderWithTuple.decode(JSONCoderWithTuple.encode_to_bytes(item)) == with_orjson
+
+
+def test_unsupported_types_raise(coder):
+    import datetime
+    for value in [datetime.datetime(2021, 1, 2), np.timedelta64(3, 's'), object()]:
+        with pytest.raises(TypeError):
+            coder.encode_to_bytes({'value': value})
+
+
+@pytest.mark.parametrize('target', [None, 'visual'])
+def test_request_encoder(coder, target):
+    encoder = RequestEncoder()
+    calls = [('load_stim', ('MovingPatch',), {'width': 10, 'color': (1, 0, 0, 1)}),
+             ('load_stim', (), {}),
+             ('set_subject_state', ({'x': 0.1, 'theta': (1, 2)},), {'flag': True})]
+    for name, args, kwargs in calls:
+        request = {'name': name, 'args': args, 'kwargs': kwargs}
+        if target is not None:
+            request['target'] = target
+        # the second call of a name reuses the cached prefix
+        for _ in range(2):
+            assert coder.decode(encoder.encode(name, args, kwargs, target=target)) == \
+                   coder.decode(coder.encode_to_bytes([request]))
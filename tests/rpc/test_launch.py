@@ -0,0 +1,31 @@
+import os
+from time import time
+
+import pytest
+
+import stimpack.rpc.echo_server
+from stimpack.rpc.launch import launch_server
+
+
+def test_launch_server():
+    client, proc = launch_server(stimpack.rpc.echo_server, return_process_handle=True)
+    try:
+        assert proc.poll() is None
+        client.echo('hi')
+        client.flush()
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def test_server_that_exits_is_detected(tmp_path):
+    # a server that fails before it starts listening, e.g. on an import error
+    server_file = tmp_path / 'broken_server.py'
+    server_file.write_text('raise ImportError("no such module")\n')
+
+    start = time()
+    with pytest.raises(Exception, match='Could not connect to server.'):
+        launch_server(str(server_file), server_poll_timeout=5)
+    if os.name == 'posix':
+        # reported as soon as the server exits, rather than after the timeout
+        assert time() - start < 4
@@ -0,0 +1,175 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('moderngl')
+
+from stimpack.visual_stim.base import BaseProgram
+from stimpack.visual_stim.shapes import GlCube
+
+
+class FakeBuffer:
+    def __init__(self, reserve=0, dynamic=False):
+        self.writes = 0
+
+    def write(self, data):
+        self.writes += 1
+
+    def release(self):
+        pass
+
+
+class FakeUniform:
+    def __init__(self):
+        self.value = None
+        self.data = None
+        self.writes = 0
+
+    def write(self, data):
+        self.data = bytes(data)
+        self.writes += 1
+
+
+class FakeProgram:
+    def __init__(self):
+        self.uniforms = {}
+
+    def __getitem__(self, name):
+        return self.uniforms.setdefault(name, FakeUniform())
+
+    def release(self):
+        pass
+
+
+class FakeVertexArray:
+    def __init__(self, ctx, program):
+        self.ctx = ctx
+        self.program = program
+
+    def render(self, mode, vertices):
+        # record the state each draw is made with
+        self.ctx.draws.append((self.ctx.viewport, self.program['Mvp'].data, vertices))
+
+    def release(self):
+        pass
+
+
+class FakeContext:
+    # stands in for a moderngl context, recording the state that paint_at sets
+    def __init__(self):
+        self.draws = []
+        self.viewport_sets = 0
+        self._viewport = (0, 0, 0, 0)
+        self.point_size = 1
+
+    @property
+    def viewport(self):
+        return self._viewport
+
+    @viewport.setter
+    def viewport(self, value):
+        self.viewport_sets += 1
+        self._viewport = tuple(int(v) for v in value)
+
+    def program(self, vertex_shader, fragment_shader):
+        return FakeProgram()
+
+    def buffer(self, reserve=0, dynamic=False):
+        return FakeBuffer(reserve, dynamic)
+
+    def vertex_array(self, program, content):
+        return FakeVertexArray(self, program)
+
+
+def make_program(ctx, stim_object):
+    program = BaseProgram(screen=None)
+    program.initialize(ctx)
+    program.stim_object = stim_object
+    return program
+
+
+class DuckTypedObject:
+    # a stim object that does not derive from GlVertices
+    def __init__(self):
+        self.vertices = np.zeros((3, 3))
+        self.colors = np.ones((4, 3))
+        self.tex_coords = None
+
+
+def test_paint_non_glvertices_object():
+    ctx = FakeContext()
+    program = make_program(ctx, DuckTypedObject())
+    mvp = np.eye(4, dtype='f4')
+
+    program.paint_at(0, [(0, 0, 10, 10)], [mvp])
+
+    assert len(ctx.draws) == 1
+    assert ctx.draws[0][2] == 3
+
+
+def test_mark_dirty_uploads_both_vertex_sets():
+    ctx = FakeContext()
+    program = make_program(ctx, GlCube())
+    vbos = [vertex_objects[0] for vertex_objects in program.vertex_object_sets]
+    mvp = np.eye(4, dtype='f4')
+
+    for _ in range(4):
+        program.paint_at(0, [(0, 0, 10, 10)], [mvp])
+    assert [vbo.writes for vbo in vbos] == [1, 1]
+
+    program.stim_object.mark_dirty()
+    for _ in range(4):
+        program.paint_at(0, [(0, 0, 10, 10)], [mvp])
+    assert [vbo.writes for vbo in vbos] == [2, 2]
+    assert not program.stim_object.dirty
+
+
+def test_mvp_written_once_per_frame_with_two_subscreens():
+    ctx = FakeContext()
+    program = make_program(ctx, GlCube())
+    viewports = [(0, 0, 10, 10), (10, 0, 10, 10)]
+    perspectives = [np.eye(4, dtype='f4'), 2*np.eye(4, dtype='f4')]
+    expected = {vp: mvp.tobytes() for vp, mvp in zip(viewports, perspectives)}
+
+    def check_draws():
+        # each subscreen is drawn once, with its own viewport and perspective matrix
+        draws = ctx.draws[-len(viewports):]
+        assert sorted(vp for vp, _, _ in draws) == sorted(viewports)
+        for vp, mvp, _ in draws:
+            assert mvp == expected[vp]
+
+    program.paint_at(0, viewports, perspectives)
+    check_draws()
+    assert program.mvp_uniform.writes == 2
+
+    for n_frames in range(1, 4):
+        program.paint_at(0, viewports, perspectives)
+        check_draws()
+        assert program.mvp_uniform.writes == 2 + n_frames
+        assert ctx.viewport_sets == 2 + n_frames
+
+    # a new perspective for one subscreen
+    perspectives = [perspectives[0], 3*np.eye(4, dtype='f4')]
+    expected[viewports[1]] = perspectives[1].tobytes()
+    program.paint_at(0, viewports, perspectives)
+    check_draws()
+
+    # the number of subscreens changes
+    viewports, perspectives = viewports[:1], perspectives[:1]
+    writes = program.mvp_uniform.writes
+    program.paint_at(0, viewports, perspectives)
+    check_draws()
+    program.paint_at(0, viewports, perspectives)
+    check_draws()
+    assert program.mvp_uniform.writes == writes + 1
+
+
+def test_viewport_shared_between_stims():
+    ctx = FakeContext()
+    programs = [make_program(ctx, GlCube()) for _ in range(2)]
+    mvp = np.eye(4, dtype='f4')
+
+    for program in programs:
+        program.paint_at(0, [(0, 0, 10, 10)], [mvp])
+    # the second stim finds the viewport already set
+    assert ctx.viewport_sets == 1
+    assert [program.mvp_uniform.writes for program in programs] == [1, 1]
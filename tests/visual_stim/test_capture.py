@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+moderngl = pytest.importorskip('moderngl')
+pytest.importorskip('PyQt6.QtOpenGLWidgets')
+
+from stimpack.visual_stim.capture import FrameCaptureProgram
+from stimpack.visual_stim.framework import downsample_frames
+
+
+def create_standalone_context():
+    # try the default standalone context first, then a headless EGL one
+    for kwargs in [{}, {'backend': 'egl'}]:
+        try:
+            return moderngl.create_context(standalone=True, require=330, **kwargs)
+        except Exception:
+            pass
+    pytest.skip('no standalone OpenGL context available')
+
+
+@pytest.fixture(scope='module')
+def ctx():
+    ctx = create_standalone_context()
+    yield ctx
+    ctx.release()
+
+
+def capture_frame(ctx, rgba, downsample_xy):
+    """
+    Read back rgba (rows bottom to top, as in OpenGL) with FrameCaptureProgram, and convert it to a uint8 frame
+    with the top row first, as the framework does with frames it captures.
+    """
+    height, width, _ = rgba.shape
+    framebuffer = ctx.framebuffer(color_attachments=[ctx.texture((width, height), 4, data=rgba.tobytes())])
+
+    capture = FrameCaptureProgram()
+    capture.initialize(ctx)
+    shape, dtype = capture.get_frame_layout(width, height, downsample_xy)
+    buffer = ctx.buffer(reserve=int(np.prod(shape)) * np.dtype(dtype).itemsize)
+    capture.read_into(buffer, framebuffer, width, height, downsample_xy=downsample_xy)
+
+    frame = np.frombuffer(buffer.read(), dtype=dtype).reshape(shape)
+    if frame.ndim == 3:
+        frame = frame[:, :, 2]  # RGBA read; keep blue
+    return frame.astype(np.uint8)[::-1]
+
+
+@pytest.mark.parametrize('downsample_xy', [1, 2, 4, 5])
+@pytest.mark.parametrize('width, height', [(64, 48), (67, 45)])
+def test_capture_matches_cpu_downsampling(ctx, width, height, downsample_xy):
+    rgba = np.random.default_rng(0).integers(0, 256, size=(height, width, 4), dtype=np.uint8)
+
+    obs = capture_frame(ctx, rgba, downsample_xy)
+
+    top_down_blue = rgba[::-1, :, 2]
+    ref = downsample_frames(top_down_blue[np.newaxis], downsample_xy)[0]
+
+    assert obs.shape == ref.shape
+    assert np.array_equal(obs, ref)
@@ -0,0 +1,113 @@
+from collections import deque
+from queue import Queue
+
+import numpy as np
+import pytest
+
+pytest.importorskip('moderngl')
+pytest.importorskip('PyQt6.QtOpenGLWidgets')
+
+from stimpack.rpc.util import start_daemon_thread
+from stimpack.visual_stim.framework import (StimDisplay, N_READBACK_BUFFERS, STIM_FRAMES_INITIAL_LENGTH,
+                                            grow_array, downsample_frames)
+
+
+def downscale_local_mean(frames, factor):
+    # what save_rendered_movie originally did with skimage.transform.downscale_local_mean(...).astype('uint8'):
+    # average factor x factor blocks in floating point, padding frames with zeros to a multiple of factor
+    n_frames, height, width = frames.shape
+    padded = np.pad(frames, ((0, 0), (0, -height % factor), (0, -width % factor)))
+    blocks = padded.reshape(n_frames, padded.shape[1] // factor, factor, padded.shape[2] // factor, factor)
+    return blocks.mean(axis=(2, 4)).astype('uint8')
+
+
+def test_grow_array():
+    array = np.arange(10, dtype=np.float32).reshape(5, 2)
+    grown = grow_array(array, 3, 4)
+    assert grown.shape == (10, 2)
+    assert grown.dtype == array.dtype
+    assert np.array_equal(grown[:3], array[:3])
+
+    assert grow_array(np.empty((0, 5)), 0, 1024).shape == (1024, 5)
+
+
+@pytest.mark.parametrize('factor', [1, 2, 3, 4, 16, 17])
+@pytest.mark.parametrize('shape', [(5, 48, 64), (3, 45, 67)])
+def test_downsample_frames(shape, factor):
+    frames = np.random.default_rng(0).integers(0, 256, size=shape, dtype=np.uint8)
+    # saturated frames check that block sums do not overflow
+    frames[0] = 255
+
+    obs = downsample_frames(frames, factor, chunk_size=2)
+
+    assert obs.dtype == np.uint8
+    assert np.array_equal(obs, downscale_local_mean(frames, factor))
+
+
+def test_downsample_frames_skimage():
+    transform = pytest.importorskip('skimage.transform')
+    frames = np.random.default_rng(1).integers(0, 256, size=(4, 45, 67), dtype=np.uint8)
+
+    ref = transform.downscale_local_mean(np.stack(list(frames), axis=2), factors=(4, 4, 1)).astype('uint8')
+
+    assert np.array_equal(np.moveaxis(downsample_frames(frames, 4), 0, 2), ref)
+
+
+class FakeBuffer:
+    # stands in for a moderngl pixel buffer that has been read into
+    def __init__(self, frame):
+        self.data = frame.tobytes()
+
+    def read(self):
+        return self.data
+
+    def read_into(self, out):
+        out[...] = np.frombuffer(self.data, dtype=out.dtype).reshape(out.shape)
+
+
+class FrameStore:
+    # the frame storage of StimDisplay, without a widget or OpenGL context
+    collect_frame = StimDisplay.collect_frame
+    readback_worker = StimDisplay.readback_worker
+    get_stim_frame_slot = StimDisplay.get_stim_frame_slot
+    get_stim_frames = StimDisplay.get_stim_frames
+    collect_pending_frames = StimDisplay.collect_pending_frames
+
+    def __init__(self, n_stim_frames_expected=None):
+        self.stim_frames = np.empty((0, 0, 0), dtype=np.uint8)
+        self.n_stim_frames = 0
+        self.n_stim_frames_expected = n_stim_frames_expected
+        self.pending_readbacks = deque()
+        self.readback_queue = Queue(maxsize=4)
+        start_daemon_thread(self.readback_worker)
+
+
+@pytest.mark.parametrize('n_stim_frames_expected', [None, 5])
+@pytest.mark.parametrize('layout', ['blue', 'rgba', 'downsampled'])
+def test_collect_frames(layout, n_stim_frames_expected):
+    rng = np.random.default_rng(2)
+    store = FrameStore(n_stim_frames_expected)
+    # more frames than STIM_FRAMES_INITIAL_LENGTH, so that stim_frames is grown
+    n_frames, height, width = STIM_FRAMES_INITIAL_LENGTH + 3, 6, 5
+
+    ref = []
+    for _ in range(n_frames):
+        # frames as read back, with rows bottom to top
+        if layout == 'blue':
+            frame = rng.integers(0, 256, size=(height, width), dtype=np.uint8)
+            ref.append(frame)
+        elif layout == 'rgba':
+            frame = rng.integers(0, 256, size=(height, width, 4), dtype=np.uint8)
+            ref.append(frame[:, :, 2])
+        else:
+            frame = rng.uniform(0, 255, size=(height, width)).astype('f4')
+            ref.append(np.floor(frame).astype(np.uint8))
+        store.pending_readbacks.append((FakeBuffer(frame), frame.shape, frame.dtype))
+        if len(store.pending_readbacks) == N_READBACK_BUFFERS:
+            store.collect_frame(*store.pending_readbacks.popleft())
+
+    # a frame of another size is dropped
+    frame = np.zeros((height+1, width), dtype=np.uint8)
+    store.pending_readbacks.append((FakeBuffer(frame), frame.shape, frame.dtype))
+
+    assert np.array_equal(store.get_stim_frames(), np.stack(ref)[:, ::-1])
@@ -0,0 +1,88 @@
+from math import radians
+
+import numpy as np
+import pytest
+
+from stimpack.visual_stim.perspective import GenPerspective, view_matrix
+from stimpack.visual_stim.util import normalize
+
+SCREENS = [
+    dict(pa=(-0.15, 0.30, -0.15), pb=(+0.15, 0.30, -0.15), pc=(-0.15, 0.30, +0.15)),
+    dict(pa=(+1, -1, -1), pb=(+1, +1, -1), pc=(+1, -1, 1), pe=(+5, 0, 0)),
+    dict(pa=(0.2, 0.1, -0.1), pb=(0.2, -0.1, -0.1), pc=(0.2, 0.1, 0.1), horizontal_flip=True, near=0.01, far=10),
+]
+
+POSES = [
+    ((0, 0, 0), 0, 0, 0),
+    ((0.01, -0.02, 0.03), radians(30), 0, 0),
+    ((0.1, 0.2, -0.05), radians(-45), radians(20), radians(10)),
+    ((-0.3, 0.0, 0.1), radians(170), radians(-60), radians(-35)),
+]
+
+
+def baseline_matrix(pa, pb, pc, pe=(0, 0, 0), near=0.0001, far=1000, subject_xyz=(0, 0, 0), horizontal_flip=False):
+    # GenPerspective.matrix as originally written
+    pa, pb, pc, pe = (np.array(p, dtype=float) for p in (pa, pb, pc, pe))
+    subject_xyz = np.array(subject_xyz, dtype=float)
+    n, f = near, far
+
+    vr = normalize(pb - pa)
+    vu = normalize(pc - pa)
+    vn = normalize(np.cross(vr, vu))
+
+    va, vb, vc = pa - pe, pb - pe, pc - pe
+
+    d = -np.dot(vn, va)
+    b = np.dot(vu, va) * n / d
+    t = np.dot(vu, vc) * n / d
+    if horizontal_flip:
+        r = np.dot(vr, va) * n / d
+        l = np.dot(vr, vb) * n / d
+    else:
+        l = np.dot(vr, va) * n / d
+        r = np.dot(vr, vb) * n / d
+
+    P = np.array([[2*n/(r-l),         0,  (r+l)/(r-l),            0],
+                  [        0, 2*n/(t-b),  (t+b)/(t-b),            0],
+                  [        0,         0, -(f+n)/(f-n), -2*f*n/(f-n)],
+                  [        0,         0,           -1,            0]], dtype=float)
+    M = np.array([[vr[0], vu[0], vn[0], 0],
+                  [vr[1], vu[1], vn[1], 0],
+                  [vr[2], vu[2], vn[2], 0],
+                  [    0,     0,     0, 1]], dtype=float)
+    T = np.array([[1, 0, 0, -subject_xyz[0]],
+                  [0, 1, 0, -subject_xyz[1]],
+                  [0, 0, 1, -subject_xyz[2]],
+                  [0, 0, 0,      1]], dtype=float)
+
+    return P.dot((M.T).dot(T)).astype('f4').tobytes(order='F')
+
+
+def as_matrix(data):
+    # column-major float32 bytes, as written to the mvp uniform
+    return np.frombuffer(bytes(data), dtype='f4').reshape(4, 4).T
+
+
+@pytest.mark.parametrize('screen', SCREENS)
+@pytest.mark.parametrize('subject_xyz', [(0, 0, 0), (0.01, -0.02, 0.03)])
+def test_matrix(screen, subject_xyz):
+    obs = GenPerspective(subject_xyz=subject_xyz, **screen).matrix
+    ref = baseline_matrix(subject_xyz=subject_xyz, **screen)
+    np.testing.assert_allclose(as_matrix(obs), as_matrix(ref), rtol=1e-5, atol=1e-6)
+
+
+@pytest.mark.parametrize('screen', [s for s in SCREENS if 'pe' not in s])
+@pytest.mark.parametrize('pose', POSES)
+def test_view_matrix(screen, pose):
+    subject_xyz, yaw, pitch, roll = pose
+    perspective = GenPerspective(**screen)
+
+    obs = view_matrix(perspective.projection, subject_xyz, yaw, pitch, roll)
+
+    # rotating the screen corners, as the framework originally did for every subscreen and frame
+    rotated = GenPerspective(subject_xyz=subject_xyz, **screen).rotz(yaw).rotx(pitch).roty(roll)
+    ref = baseline_matrix(pa=rotated.pa, pb=rotated.pb, pc=rotated.pc, pe=rotated.pe, near=rotated.near,
+                          far=rotated.far, subject_xyz=subject_xyz, horizontal_flip=rotated.horizontal_flip)
+
+    assert obs.dtype == np.float32 and obs.flags['C_CONTIGUOUS']
+    np.testing.assert_allclose(as_matrix(obs), as_matrix(ref), rtol=1e-5, atol=1e-5)
@@ -0,0 +1,49 @@
+import numpy as np
+
+from stimpack.rpc.util import JSONCoderWithTuple
+from stimpack.visual_stim.screen import Screen, SubScreen
+
+
+def get_screen():
+    subscreens = [SubScreen(pa=np.array([-0.1, 0.2, -0.1]), pb=[0.1, 0.2, -0.1], pc=(-0.1, 0.2, 0.1),
+                            viewport_ll=(-1, -1), viewport_width=1, viewport_height=2),
+                  SubScreen(pa=(0.2, 0.1, -0.1), pb=(0.2, -0.1, -0.1), pc=(0.2, 0.1, 0.1),
+                            viewport_ll=np.array([0, -1]), viewport_width=1, viewport_height=2)]
+    return Screen(subscreens=subscreens, x_display=':1', display_index=1, fullscreen=False, vsync=False,
+                  square_size=(0.1, 0.2), square_loc=(0.75, -1), square_on_color=1.5, square_off_color=0.2,
+                  name='Left', horizontal_flip=True, pa=[-0.2, 0.3, -0.1], pb=(0.2, 0.3, -0.1), pc=(-0.2, 0.3, 0.1),
+                  use_egl=True, samples=1)
+
+
+def test_round_trip():
+    screen = get_screen()
+    # screens are sent to the stim server as JSON
+    data = JSONCoderWithTuple.decode(JSONCoderWithTuple.encode(screen.serialize()))
+    copy = Screen.deserialize(data)
+
+    assert copy.serialize() == screen.serialize()
+    for name in ['width', 'height']:
+        assert getattr(copy, name) == getattr(screen, name)
+    for name in ['subscreen_pa', 'subscreen_pb', 'subscreen_pc', 'subscreen_widths', 'subscreen_heights']:
+        assert np.array_equal(getattr(copy, name), getattr(screen, name))
+
+
+def test_serialized_values():
+    data = get_screen().serialize()
+
+    assert data['pa'] == (-0.2, 0.3, -0.1)
+    assert data['square_on_color'] == 1.0
+    assert data['samples'] == 1
+    assert data['subscreens'][0] == [(-0.1, 0.2, -0.1), (0.1, 0.2, -0.1), (-0.1, 0.2, 0.1), (-1.0, -1.0), 1, 2]
+    assert data['subscreens'][1][3] == (0.0, -1.0)
+
+
+def test_deserialize_defaults():
+    # screens serialized before samples (or use_egl) existed fall back to the defaults
+    data = get_screen().serialize()
+    del data['samples'], data['use_egl']
+    screen = Screen.deserialize(data)
+
+    assert screen.samples == 4
+    assert screen.use_egl is False
+    assert screen.name == 'Left'
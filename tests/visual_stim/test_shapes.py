@@ -0,0 +1,241 @@
+"""
+Compare the shapes against reference implementations that build them one triangle at a time, as the original
+shapes did.
+"""
+
+import copy
+from math import radians
+
+import numpy as np
+import pytest
+
+from stimpack.visual_stim import shapes, util
+
+
+def quad(v1, v2, v3, v4, color, tc1=None, tc2=None, tc3=None, tc4=None):
+    # same triangles as GlQuad
+    return [(v1, v2, v3, color, tc1, tc2, tc3), (v1, v3, v4, color, tc1, tc3, tc4)]
+
+
+def build(tris, offset=(0, 0, 0)):
+    """
+    Return (vertices, colors, tex_coords) arrays for a list of (v1, v2, v3, color, tc1, tc2, tc3) triangles,
+    translated by offset.
+    """
+    vertices = np.array([v for tri in tris for v in tri[:3]], dtype=float).T + np.array(offset, dtype=float)[:, np.newaxis]
+    colors = np.array([tri[3] for tri in tris for _ in range(3)], dtype=float).T
+    if tris[0][4] is None:
+        tex_coords = None
+    else:
+        tex_coords = np.array([tc for tri in tris for tc in tri[4:]], dtype=float).T
+    return vertices, colors, tex_coords
+
+
+def assert_matches(obj, vertices, colors, tex_coords=None):
+    np.testing.assert_allclose(obj.vertices, vertices, rtol=1e-6, atol=1e-6)
+    np.testing.assert_allclose(obj.colors, colors, rtol=1e-6, atol=1e-6)
+    if tex_coords is None:
+        assert obj.tex_coords is None
+    else:
+        np.testing.assert_allclose(obj.tex_coords, tex_coords, rtol=1e-6, atol=1e-6)
+
+
+def ref_circle(color, center, radius, n_steps):
+    angles = np.linspace(0, 2*np.pi, n_steps+1)
+    tris = []
+    for wedge in range(n_steps):
+        v1 = (radius*np.sin(angles[wedge]), 0, radius*np.cos(angles[wedge]))
+        v2 = (radius*np.sin(angles[wedge+1]), 0, radius*np.cos(angles[wedge+1]))
+        tris.append((v1, v2, (0, 0, 0), util.get_rgba(color), None, None, None))
+    return build(tris, center)
+
+
+def ref_box(colors, center, x, y, z):
+    tris = (quad((+x, -y, -z), (+x, +y, -z), (+x, +y, +z), (+x, -y, +z), colors['+x'])
+            + quad((-x, -y, -z), (-x, +y, -z), (-x, +y, +z), (-x, -y, +z), colors['-x'])
+            + quad((+x, +y, -z), (-x, +y, -z), (-x, +y, +z), (+x, +y, +z), colors['+y'])
+            + quad((+x, -y, -z), (-x, -y, -z), (-x, -y, +z), (+x, -y, +z), colors['-y'])
+            + quad((+x, -y, +z), (+x, +y, +z), (-x, +y, +z), (-x, -y, +z), colors['+z'])
+            + quad((+x, -y, -z), (+x, +y, -z), (-x, +y, -z), (-x, -y, -z), colors['-z']))
+    return build(tris, center)
+
+
+def ref_rect(to_cartesian, radius, width, height, color, n_steps_x, n_steps_y, texture=False, texture_shift=(0, 0)):
+    color = util.get_rgba(color)
+    d_theta = radians(width) / n_steps_x
+    d_phi = radians(height) / n_steps_y
+    shift = lambda tc: tuple(a + b for a, b in zip(tc, texture_shift))
+    tris = []
+    for rr in range(n_steps_y):
+        for cc in range(n_steps_x):
+            theta = np.pi/2 + radians(width) * (-1/2 + (cc/n_steps_x))
+            phi = np.pi/2 + radians(height) * (-1/2 + (rr/n_steps_y))
+            v1 = to_cartesian(radius, theta, phi)
+            v2 = to_cartesian(radius, theta, phi + d_phi)
+            v3 = to_cartesian(radius, theta + d_theta, phi)
+            v4 = to_cartesian(radius, theta + d_theta, phi + d_phi)
+            if texture:
+                tc1 = shift((cc/n_steps_x, rr/n_steps_y))
+                tc2 = shift((cc/n_steps_x, (rr+1)/n_steps_y))
+                tc3 = shift(((cc+1)/n_steps_x, rr/n_steps_y))
+                tc4 = shift(((cc+1)/n_steps_x, (rr+1)/n_steps_y))
+                tris += [(v1, v2, v4, color, tc1, tc2, tc4), (v1, v3, v4, color, tc1, tc3, tc4)]
+            else:
+                tris += [(v1, v2, v4, color, None, None, None), (v1, v3, v4, color, None, None, None)]
+    return build(tris)
+
+
+def ref_ellipse(to_cartesian, radius, width, height, color, location, n_steps):
+    v_center = to_cartesian(radius, np.pi/2, np.pi/2)
+    angles = np.linspace(0, 2*np.pi, n_steps+1)
+    tris = []
+    for wedge in range(n_steps):
+        v1 = to_cartesian(radius, np.pi/2 + radians(width/2)*np.cos(angles[wedge]),
+                          np.pi/2 + radians(height/2)*np.sin(angles[wedge]))
+        v2 = to_cartesian(radius, np.pi/2 + radians(width/2)*np.cos(angles[wedge+1]),
+                          np.pi/2 + radians(height/2)*np.sin(angles[wedge+1]))
+        tris.append((v1, v2, v_center, util.get_rgba(color), None, None, None))
+    return build(tris, location)
+
+
+def ref_cylinder(height, radius, location, angular_extent, color, n_faces, alpha_by_face, texture, texture_shift,
+                 n_texture_repeat_x, n_texture_repeat_y):
+    color = util.get_rgba(color)
+    if alpha_by_face is None:
+        alpha_by_face = color[3]*np.ones(n_faces)
+    d_theta = np.radians(angular_extent) / n_faces
+    theta_start = -np.radians(angular_extent)/2
+    shift = lambda tc: tuple(a + b for a, b in zip(tc, texture_shift))
+    tris = []
+    for face in range(n_faces):
+        v1 = util.cylindrical_to_cartesian(radius, theta_start+face*d_theta, height/2)
+        v2 = util.cylindrical_to_cartesian(radius, theta_start+face*d_theta, -height/2)
+        v3 = util.cylindrical_to_cartesian(radius, theta_start+(face+1)*d_theta, -height/2)
+        v4 = util.cylindrical_to_cartesian(radius, theta_start+(face+1)*d_theta, height/2)
+        if texture:
+            # alpha_by_face is only used for textured cylinders
+            tris += quad(v1, v2, v3, v4, [color[0], color[1], color[2], alpha_by_face[face]],
+                         shift((face/n_faces*n_texture_repeat_x, n_texture_repeat_y)),
+                         shift((face/n_faces*n_texture_repeat_x, 0)),
+                         shift(((face+1)/n_faces*n_texture_repeat_x, 0)),
+                         shift(((face+1)/n_faces*n_texture_repeat_x, n_texture_repeat_y)))
+        else:
+            tris += quad(v1, v2, v3, v4, color)
+    return build(tris, location)
+
+
+@pytest.mark.parametrize('kwargs', [dict(color=(1, 0, 0, 1), center=(1, 2, 3), radius=2, n_steps=12),
+                                    dict(color=0.5, center=(0, 0, 0), radius=1.0, n_steps=36)])
+def test_circle(kwargs):
+    assert_matches(shapes.GlCircle(**kwargs), *ref_circle(**kwargs))
+
+
+def test_cube_and_box():
+    colors = {'+x': (0, 0, 1, 1), '-x': (0, 1, 0, 1), '+y': (1, 0, 0, 1),
+              '-y': (0, 1, 1, 1), '+z': (1, 1, 0, 1), '-z': (1, 0, 1, 1)}
+    assert_matches(shapes.GlCube(center=[1, 0, 2], side_length=2), *ref_box(colors, (1, 0, 2), 1, 1, 1))
+
+    colors['+x'] = (1, 1, 1, 0.5)
+    box = shapes.GlBox(colors={'+x': (1, 1, 1, 0.5)}, center=(0, 1, 0), side_lengths={'x': 1, 'y': 2, 'z': 3})
+    assert_matches(box, *ref_box(colors, (0, 1, 0), 0.5, 1, 1.5))
+
+
+@pytest.mark.parametrize('kwargs', [dict(width=30, height=10, sphere_radius=2, color=0.5, n_steps_x=5, n_steps_y=3),
+                                    dict(width=20, height=20, sphere_radius=1, color=[1, 1, 1, 1], n_steps_x=6, n_steps_y=6)])
+def test_spherical_rect(kwargs):
+    ref_kwargs = dict(kwargs)
+    radius = ref_kwargs.pop('sphere_radius')
+    assert_matches(shapes.GlSphericalRect(**kwargs), *ref_rect(util.spherical_to_cartesian, radius, **ref_kwargs))
+
+
+@pytest.mark.parametrize('texture', [False, True])
+def test_spherical_textured_rect(texture):
+    kwargs = dict(width=30, height=10, color=(0.2, 0.4, 0.6, 1), n_steps_x=4, n_steps_y=3,
+                  texture=texture, texture_shift=(0.1, -0.2))
+    obj = shapes.GlSphericalTexturedRect(sphere_radius=1.5, **kwargs)
+    assert_matches(obj, *ref_rect(util.spherical_to_cartesian, 1.5, **kwargs))
+
+
+def test_cylindrical_with_phi_rect():
+    kwargs = dict(width=30, height=10, color=1, n_steps_x=5, n_steps_y=3)
+    obj = shapes.GlCylindricalWithPhiRect(cylinder_radius=2, **kwargs)
+    assert_matches(obj, *ref_rect(util.cylindrical_w_phi_to_cartesian, 2, **kwargs))
+
+
+def test_ellipses_and_circ():
+    obj = shapes.GlSphericalEllipse(width=30, height=10, sphere_radius=2, color=0.3, sphere_location=(1, 2, 3), n_steps=10)
+    assert_matches(obj, *ref_ellipse(util.spherical_to_cartesian, 2, 30, 10, 0.3, (1, 2, 3), 10))
+
+    obj = shapes.GlCylindricalWithPhiEllipse(width=30, height=10, cylinder_radius=2, color=0.3,
+                                             cylinder_location=(1, 2, 3), n_steps=10)
+    assert_matches(obj, *ref_ellipse(util.cylindrical_w_phi_to_cartesian, 2, 30, 10, 0.3, (1, 2, 3), 10))
+
+    obj = shapes.GlSphericalCirc(circle_radius=15, sphere_radius=1, color=(1, 0, 0, 1), sphere_location=(0, 1, 0), n_steps=9)
+    assert_matches(obj, *ref_ellipse(util.spherical_to_cartesian, 1, 30, 30, (1, 0, 0, 1), (0, 1, 0), 9))
+
+
+@pytest.mark.parametrize('kwargs', [
+    dict(cylinder_height=2, cylinder_radius=3, cylinder_location=(1, 2, 3), cylinder_angular_extent=270, n_faces=7),
+    dict(n_faces=5, alpha_by_face=np.linspace(0, 1, 5)),
+    dict(n_faces=5, texture=True, texture_shift=(0.3, 0.1), n_texture_repeat_x=2, n_texture_repeat_y=3,
+         alpha_by_face=np.linspace(0, 1, 5), color=(0.2, 0.3, 0.4, 1)),
+    dict(n_faces=6, texture=True),
+])
+def test_cylinder(kwargs):
+    defaults = dict(cylinder_height=10, cylinder_radius=1, cylinder_location=(0, 0, 0), cylinder_angular_extent=360,
+                    color=[1, 1, 1, 1], n_faces=32, alpha_by_face=None, texture=False, texture_shift=(0, 0),
+                    n_texture_repeat_x=1, n_texture_repeat_y=1)
+    ref_kwargs = {k.replace('cylinder_', '') if k.startswith('cylinder_') else k: v for k, v in {**defaults, **kwargs}.items()}
+    assert_matches(shapes.GlCylinder(**kwargs), *ref_cylinder(**ref_kwargs))
+
+
+def test_points():
+    theta, phi = [0, 10, 20, 30], [5, 6, 7, 8]
+
+    obj = shapes.GlSphericalPoints(sphere_radius=2, color=0.5, theta=theta, phi=phi)
+    vertices = np.array([util.spherical_to_cartesian(2, np.pi/2 + radians(t), np.pi/2 + radians(p))
+                         for t, p in zip(theta, phi)]).T
+    assert_matches(obj, vertices, np.tile(util.get_rgba(0.5), (4, 1)).T)
+
+    obj = shapes.GlCylindricalPoints(cylinder_radius=2, color=[1, 0, 0, 1], theta=theta, phi=phi)
+    vertices = np.array([util.cylindrical_w_phi_to_cartesian(2, radians(t), radians(p)) for t, p in zip(theta, phi)]).T
+    assert_matches(obj, vertices, np.tile([1, 0, 0, 1], (4, 1)).T)
+
+    locations = [[0, 1, 2], [3, 4, 5], [6, 7, 8]]
+    obj = shapes.GlPointCollection(locations=locations, color=0.3)
+    assert_matches(obj, np.vstack(locations), np.tile(util.get_rgba(0.3), (3, 1)).T)
+
+
+def test_quad_and_tri():
+    v1, v2, v3, v4 = (0, 0, 0), (1, 0, 0), (1, 1, 0), (0, 1, 0)
+    color = (1, 0.5, 0.25, 1)
+
+    assert_matches(shapes.GlTri(v1, v2, v3, color), *build([(v1, v2, v3, color, None, None, None)]))
+    assert_matches(shapes.GlQuad(v1, v2, v3, v4, color), *build(quad(v1, v2, v3, v4, color)))
+
+    obj = shapes.GlQuad(v1, v2, v3, v4, color, texture_shift=(0.5, 0.25), use_texture=True)
+    tcs = [(0.5, 0.25), (1.5, 0.25), (1.5, 1.25), (0.5, 1.25)]
+    assert_matches(obj, *build(quad(v1, v2, v3, v4, color, *tcs)))
+
+
+def test_transforms_and_add():
+    cylinder = shapes.GlCylinder(n_faces=4, texture=True)
+    vertices, colors, tex_coords = cylinder.vertices, cylinder.colors, cylinder.tex_coords
+
+    moved = cylinder.rotate(0.1, 0.2, 0.3).translate((1, 2, 3)).scale(2).set_color((0.1, 0.2, 0.3, 0.4))
+    ref_vertices = util.scale(util.translate(util.rotate(vertices, 0.1, 0.2, 0.3), (1, 2, 3)), 2)
+    assert_matches(moved, ref_vertices, np.tile((0.1, 0.2, 0.3, 0.4), (vertices.shape[1], 1)).T, tex_coords)
+    assert_matches(cylinder.shift_texture((0.1, 0.2)), vertices, colors, tex_coords + np.array([[0.1], [0.2]]))
+
+    # accumulate translated copies, as stims with many objects do
+    accumulated = shapes.GlVertices()
+    locations = [(1, 0, 0), (0, 1, 0), (0, 0, 1)]
+    for location in locations:
+        accumulated.add(copy.copy(cylinder).translate(location))
+    assert_matches(accumulated,
+                   np.concatenate([util.translate(vertices, location) for location in locations], axis=1),
+                   np.concatenate([colors] * 3, axis=1),
+                   np.concatenate([tex_coords] * 3, axis=1))
+
+    # the original object is unchanged
+    assert_matches(cylinder, vertices, colors, tex_coords)
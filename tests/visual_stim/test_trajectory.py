@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('scipy')
+
+from stimpack.visual_stim.trajectory import (TVPairs, Sinusoid, make_as_trajectory, make_batch_getter,
+                                             return_for_time_t, sample_trajectory)
+
+TIMES = [-1.0, 0.0, 0.25, 1.0, 1.7, 3.0, 5.5]
+
+
+def get_parameters():
+    return [
+        TVPairs([(0, 0), (1, 10), (3, 4)]),
+        TVPairs([(0, 1), (1, -2), (3, 8)]),
+        TVPairs([(0, 5), (2, 6)]),
+        TVPairs([(0, 2), (1, 3), (3, 4)], kind='previous'),
+        TVPairs([(0, 2), (1, 3), (3, 4)], kind='previous'),
+        TVPairs([(0, (1, 0, 0, 1)), (3, (0, 0, 1, 1))]),
+        TVPairs([(0, 0), (1, 10), (3, 4)], kind='nearest'),
+        Sinusoid(amplitude=2, temporal_frequency=0.5, offset=1),
+        make_as_trajectory({'name': 'TVPairs', 'tv_pairs': [(0, 0), (1, 10), (3, 4)], 'kind': 'linear'}),
+        (0.5, 0.5, 0.5, 1),
+        7,
+    ]
+
+
+def test_make_batch_getter():
+    parameters = get_parameters()
+    get_values = make_batch_getter(parameters)
+
+    for t in TIMES:
+        obs = get_values(t)
+        ref = [return_for_time_t(parameter, t) for parameter in parameters]
+        assert len(obs) == len(ref)
+        for o, r in zip(obs, ref):
+            np.testing.assert_allclose(o, r, err_msg=f't = {t}')
+
+
+@pytest.mark.parametrize('parameter', get_parameters())
+def test_sample_trajectory(parameter):
+    obs = sample_trajectory(parameter, TIMES)
+    ref = np.array([return_for_time_t(parameter, t) for t in TIMES])
+    assert obs.shape == ref.shape
+    np.testing.assert_allclose(obs, ref)